@@ -4,15 +4,141 @@ Handles UDP communication with Argus for real-time measurement results
 """
 
 import asyncio
-import socket
+import io
 import struct
 import logging
+import time
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional, Callable, Dict, Any
-import xml.etree.ElementTree as ET
+from typing import Optional, Callable, Dict, Any, List
+
+import numpy as np
+
+from batch_writer import BatchWriter
+
+try:
+    from lxml import etree as ET
+except ImportError:  # Fall back to the stdlib C-accelerated ElementTree
+    import xml.etree.ElementTree as ET
 
 logger = logging.getLogger(__name__)
 
+# Precompiled binary layouts
+# ACD header: magic(4), message type(2), message length(2), sequence number(4)
+_HDR = struct.Struct('>IHHi')
+# Header fields following the magic, unpacked only once the magic matched
+_HDR_FIELDS = struct.Struct('>HHi')
+_ACD_MAGIC = b'ACD\x00'
+# FFM result: freq(8), level(4), bandwidth(4), time(8)
+_FFM = struct.Struct('>dffQ')
+# SCAN result: num_points(4), followed by num_points records of freq(8), level(4)
+_SCAN_COUNT = struct.Struct('>I')
+_SCAN_POINT = np.dtype([('freq', '>f8'), ('level', '>f4')])
+
+# Known XML measurement tags and the result keys they map to
+_XML_FIELDS = {
+    'ORDER_ID': 'order_id',
+    'MEAS_TYPE': 'measurement_type',
+    'FREQUENCY': 'frequency',
+    'LEVEL': 'level',
+    'BANDWIDTH': 'bandwidth',
+    'STATION': 'station',
+    'DEVICE': 'device',
+}
+
+
+class _LazyHex:
+    """Hex rendering of a payload, computed only when actually formatted"""
+    
+    __slots__ = ('data',)
+    
+    def __init__(self, data: bytes):
+        self.data = data
+        
+    def __str__(self) -> str:
+        return self.data.hex()
+        
+    __repr__ = __str__
+
+
+# XML result fields stored as numbers
+_NUMERIC_XML_FIELDS = ('frequency', 'level', 'bandwidth')
+
+
+def _decode_numeric_fields(result: 'ACDMeasurement'):
+    """
+    Convert the numeric text fields of an XML result to floats, in place
+    
+    Done at parse time so measurement handlers see the same values that are
+    stored; unparseable values are left as text.
+    """
+    for key in _NUMERIC_XML_FIELDS:
+        value = getattr(result, key)
+        if isinstance(value, str) and value:
+            try:
+                setattr(result, key, float(value))
+            except ValueError:
+                pass
+
+
+@dataclass(slots=True)
+class ACDMeasurement:
+    """
+    Parsed ACD measurement result
+    
+    Slotted so results waiting in the work queue stay small; converted to a
+    MongoDB document with to_document() when stored.
+    """
+    format: Optional[str] = None
+    order_id: Optional[str] = None
+    measurement_type: Optional[str] = None
+    frequency: Any = None
+    level: Any = None
+    bandwidth: Any = None
+    station: Optional[str] = None
+    device: Optional[str] = None
+    source_addr: Optional[tuple] = None
+    sequence_number: Optional[int] = None
+    # Raw receive time; stored as the 'timestamp' datetime
+    timestamp_ns: Optional[int] = None
+    # Format-specific fields (opt-in additional XML tags, SCAN points, errors)
+    extra: Optional[Dict[str, Any]] = None
+    
+    def to_document(self) -> Dict[str, Any]:
+        """Build the database document, omitting unset fields"""
+        doc = {}
+        for name in _DOCUMENT_FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                doc[name] = value
+        if self.extra:
+            for key, value in self.extra.items():
+                # Render deferred hex dumps of unparseable payloads
+                doc[key] = str(value) if isinstance(value, _LazyHex) else value
+        if self.timestamp_ns is not None:
+            doc['timestamp'] = datetime.fromtimestamp(self.timestamp_ns / 1e9)
+        return doc
+
+
+_DOCUMENT_FIELDS = (
+    'format', 'order_id', 'measurement_type', 'frequency', 'level', 'bandwidth',
+    'station', 'device', 'source_addr', 'sequence_number',
+)
+
+
+class _ACDDatagramProtocol(asyncio.DatagramProtocol):
+    """asyncio datagram protocol that hands received packets to an ACDProtocol"""
+    
+    def __init__(self, owner: 'ACDProtocol'):
+        self.owner = owner
+        
+    def datagram_received(self, data: bytes, addr: tuple):
+        self.owner._process_message(data, addr)
+        
+    def error_received(self, exc: Exception):
+        logger.error(f"ACD UDP socket error: {exc}")
+
+
 class ACDProtocol:
     """ACD Protocol Handler for UDP communication with Argus"""
     
@@ -22,21 +148,42 @@ class ACDProtocol:
     MSG_TYPE_ERROR = 0x03
     MSG_TYPE_ACKNOWLEDGMENT = 0x04
     
-    def __init__(self, host: str = "0.0.0.0", port: int = 9876):
+    # Maximum number of parsed measurements waiting for the callback
+    QUEUE_MAXSIZE = 1024
+    # Number of tasks running the measurement callback concurrently
+    NUM_WORKERS = 4
+    
+    def __init__(self, host: str = "0.0.0.0", port: int = 9876, collect_extra_fields: bool = False):
         """
         Initialize ACD Protocol Handler
         
         Args:
             host: IP address to bind UDP socket (default: 0.0.0.0 for all interfaces)
             port: UDP port to listen on (default: 9876, configurable in Argus)
+            collect_extra_fields: Also keep XML tags outside the known field set
+                (requires parsing the whole document)
         """
         self.host = host
         self.port = port
-        self.socket: Optional[socket.socket] = None
+        self.collect_extra_fields = collect_extra_fields
+        self.transport: Optional[asyncio.DatagramTransport] = None
         self.running = False
         self.callback: Optional[Callable] = None
         
-    def set_callback(self, callback: Callable[[Dict[str, Any]], None]):
+        self._work_q: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.dropped_count = 0
+        
+        # Command sequence number: seeded from the clock (ms), then incremented.
+        # The header field is a signed 32-bit int.
+        self._seq = (time.time_ns() // 1_000_000) & 0x7FFFFFFF
+        
+        # Send buffer reused for every command (message length field is 16-bit)
+        self._send_buf = bytearray(_HDR.size + 0xFFFF)
+        self._send_view = memoryview(self._send_buf)
+        self._last_drop_log = 0.0
+        
+    def set_callback(self, callback: Callable[[ACDMeasurement], None]):
         """
         Set callback function for received messages
         
@@ -48,42 +195,53 @@ class ACDProtocol:
     async def start(self):
         """Start UDP listener"""
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.socket.bind((self.host, self.port))
-            self.socket.setblocking(False)
+            loop = asyncio.get_running_loop()
+            self._work_q = asyncio.Queue(maxsize=self.QUEUE_MAXSIZE)
+            
+            # Receive and parsing are driven by the transport; measurement
+            # callbacks (database writes) run on worker tasks so a slow
+            # callback never stalls the socket
+            self.transport, _ = await loop.create_datagram_endpoint(
+                lambda: _ACDDatagramProtocol(self),
+                local_addr=(self.host, self.port)
+            )
             self.running = True
+            self._workers = [
+                loop.create_task(self._worker_loop())
+                for _ in range(self.NUM_WORKERS)
+            ]
             
             logger.info(f"ACD UDP listener started on {self.host}:{self.port}")
             
-            # Start listening loop
-            await self._listen_loop()
-            
         except Exception as e:
             logger.error(f"Error starting ACD listener: {e}")
             raise
             
-    async def _listen_loop(self):
-        """Main listening loop"""
-        loop = asyncio.get_event_loop()
-        
+    def _dispatch_result(self, result: ACDMeasurement):
+        """Queue a parsed measurement for the workers, dropping it if they are behind"""
+        try:
+            self._work_q.put_nowait(result)
+        except asyncio.QueueFull:
+            self.dropped_count += 1
+            # Rate-limit the warning to once per second
+            now = time.monotonic()
+            if now - self._last_drop_log >= 1.0:
+                self._last_drop_log = now
+                logger.warning(f"ACD work queue full, {self.dropped_count} measurements dropped so far")
+                
+    async def _worker_loop(self):
+        """Run the measurement callback for queued results"""
         while self.running:
             try:
-                # Receive UDP packet (non-blocking)
-                data, addr = await loop.sock_recvfrom(self.socket, 65536)
+                result = await self._work_q.get()
+                await self.callback(result)
                 
-                if data:
-                    logger.debug(f"Received {len(data)} bytes from {addr}")
-                    # Process message
-                    await self._process_message(data, addr)
-                    
             except asyncio.CancelledError:
-                logger.info("ACD listener cancelled")
                 break
             except Exception as e:
-                logger.error(f"Error in ACD listen loop: {e}")
-                await asyncio.sleep(0.1)  # Prevent tight loop on error
+                logger.error(f"Error in ACD measurement callback: {e}")
                 
-    async def _process_message(self, data: bytes, addr: tuple):
+    def _process_message(self, data: bytes, addr: tuple):
         """
         Process received ACD message
         
@@ -91,55 +249,73 @@ class ACDProtocol:
             data: Raw message bytes
             addr: Sender address (host, port)
         """
+        logger.debug("Received %d bytes from %s", len(data), addr)
+        
+        # Invalid packets are rejected with plain early returns; only the
+        # dispatch (parsers and queueing) needs exception handling
+        header = self._parse_header(data, addr)
+        if header is None:
+            return
+        msg_type, msg_length, seq_num = header
+        
+        # Extract payload
+        payload = data[_HDR.size:_HDR.size + msg_length]
+        
         try:
-            # Parse ACD message header
-            if len(data) < 12:
-                logger.warning(f"Message too short from {addr}: {len(data)} bytes")
-                return
-                
-            # ACD Header Format (12 bytes):
-            # - Magic: 4 bytes (0x41434400 = "ACD\0")
-            # - Message Type: 2 bytes
-            # - Message Length: 2 bytes
-            # - Sequence Number: 4 bytes
+            self._dispatch(msg_type, payload, seq_num, addr)
+        except Exception as e:
+            logger.error(f"Error processing ACD message: {e}")
             
-            magic, msg_type, msg_length, seq_num = struct.unpack('>IHHi', data[:12])
+    def _parse_header(self, data: bytes, addr: tuple) -> Optional[tuple]:
+        """
+        Validate and parse the ACD message header
+        
+        ACD Header Format (12 bytes):
+        - Magic: 4 bytes (0x41434400 = "ACD\0")
+        - Message Type: 2 bytes
+        - Message Length: 2 bytes
+        - Sequence Number: 4 bytes
+        
+        Returns:
+            (msg_type, msg_length, seq_num), or None if the packet is invalid
+        """
+        if len(data) < _HDR.size:
+            logger.warning("Message too short from %s: %d bytes", addr, len(data))
+            return None
             
-            # Verify magic number
-            if magic != 0x41434400:
-                logger.warning(f"Invalid magic number from {addr}: {hex(magic)}")
-                return
-                
-            # Extract payload
-            payload = data[12:12+msg_length]
+        # Verify magic number with a plain prefix compare
+        if not data.startswith(_ACD_MAGIC):
+            logger.warning("Invalid magic number from %s: 0x%s", addr, _LazyHex(data[:4]))
+            return None
             
-            # Parse based on message type
-            if msg_type == self.MSG_TYPE_MEASUREMENT_RESULT:
-                result = self._parse_measurement_result(payload)
-                result['source_addr'] = addr
-                result['sequence_number'] = seq_num
-                result['timestamp'] = datetime.now()
-                
-                # Call callback if set
-                if self.callback:
-                    await self.callback(result)
-                    
-            elif msg_type == self.MSG_TYPE_STATUS:
-                logger.info(f"Status message from {addr}: {payload.decode('utf-8', errors='ignore')}")
-                
-            elif msg_type == self.MSG_TYPE_ERROR:
-                logger.error(f"Error message from {addr}: {payload.decode('utf-8', errors='ignore')}")
-                
-            elif msg_type == self.MSG_TYPE_ACKNOWLEDGMENT:
-                logger.debug(f"ACK from {addr}, seq: {seq_num}")
-                
-            else:
-                logger.warning(f"Unknown message type from {addr}: {msg_type}")
+        return _HDR_FIELDS.unpack_from(data, 4)
+        
+    def _dispatch(self, msg_type: int, payload: bytes, seq_num: int, addr: tuple):
+        """Handle a validated ACD message based on its type"""
+        # Parse based on message type
+        if msg_type == self.MSG_TYPE_MEASUREMENT_RESULT:
+            result = self._parse_measurement_result(payload)
+            result.source_addr = addr
+            result.sequence_number = seq_num
+            result.timestamp_ns = time.time_ns()
+            
+            # Hand off to the callback workers if a callback is set
+            if self.callback:
+                self._dispatch_result(result)
                 
-        except Exception as e:
-            logger.error(f"Error processing ACD message: {e}")
+        elif msg_type == self.MSG_TYPE_STATUS:
+            logger.info(f"Status message from {addr}: {payload.decode('utf-8', errors='ignore')}")
             
-    def _parse_measurement_result(self, payload: bytes) -> Dict[str, Any]:
+        elif msg_type == self.MSG_TYPE_ERROR:
+            logger.error(f"Error message from {addr}: {payload.decode('utf-8', errors='ignore')}")
+            
+        elif msg_type == self.MSG_TYPE_ACKNOWLEDGMENT:
+            logger.debug("ACK from %s, seq: %d", addr, seq_num)
+            
+        else:
+            logger.warning("Unknown message type from %s: %d", addr, msg_type)
+            
+    def _parse_measurement_result(self, payload: bytes) -> ACDMeasurement:
         """
         Parse measurement result payload
         
@@ -147,7 +323,7 @@ class ACDProtocol:
             payload: Message payload bytes
             
         Returns:
-            Dictionary with parsed measurement data
+            Parsed measurement data
         """
         try:
             # Check if payload is XML or binary
@@ -160,38 +336,44 @@ class ACDProtocol:
                 
         except Exception as e:
             logger.error(f"Error parsing measurement result: {e}")
-            return {'error': str(e), 'raw_data': payload.hex()}
+            return ACDMeasurement(extra={'error': str(e), 'raw_data': _LazyHex(payload)})
             
-    def _parse_xml_result(self, payload: bytes) -> Dict[str, Any]:
+    def _parse_xml_result(self, payload: bytes) -> ACDMeasurement:
         """Parse XML measurement result"""
         try:
-            xml_str = payload.decode('utf-8')
-            root = ET.fromstring(xml_str)
-            
-            result = {
-                'format': 'xml',
-                'order_id': root.findtext('.//ORDER_ID'),
-                'measurement_type': root.findtext('.//MEAS_TYPE'),
-                'frequency': root.findtext('.//FREQUENCY'),
-                'level': root.findtext('.//LEVEL'),
-                'bandwidth': root.findtext('.//BANDWIDTH'),
-                'station': root.findtext('.//STATION'),
-                'device': root.findtext('.//DEVICE'),
-            }
+            result = ACDMeasurement(format='xml')
+            extra = {} if self.collect_extra_fields else None
+            remaining = len(_XML_FIELDS)
             
-            # Parse additional fields based on measurement type
-            for elem in root.iter():
-                if elem.tag not in ['ORDER_ID', 'MEAS_TYPE', 'FREQUENCY', 'LEVEL', 'BANDWIDTH', 'STATION', 'DEVICE']:
-                    if elem.text:
-                        result[elem.tag.lower()] = elem.text
+            # Stream the payload instead of building a full tree; the parser
+            # reads the encoding from the XML declaration. Unless extra fields
+            # are wanted, stop as soon as every known field has been seen.
+            for _, elem in ET.iterparse(io.BytesIO(payload), events=('end',)):
+                tag = elem.tag
+                if isinstance(tag, str):  # Skip comments / processing instructions
+                    key = _XML_FIELDS.get(tag)
+                    if key:
+                        if getattr(result, key) is None:
+                            setattr(result, key, elem.text or '')
+                            remaining -= 1
+                    elif extra is not None and elem.text:
+                        # Additional fields based on measurement type
+                        extra[tag.lower()] = elem.text
+                # Children have been consumed by the time their parent ends
+                elem.clear()
+                if not remaining and extra is None:
+                    break
                         
+            _decode_numeric_fields(result)
+            if extra:
+                result.extra = extra
             return result
             
         except Exception as e:
             logger.error(f"Error parsing XML result: {e}")
-            return {'error': str(e), 'raw_xml': payload.decode('utf-8', errors='ignore')}
+            return ACDMeasurement(extra={'error': str(e), 'raw_xml': payload.decode('utf-8', errors='ignore')})
             
-    def _parse_binary_result(self, payload: bytes) -> Dict[str, Any]:
+    def _parse_binary_result(self, payload: bytes) -> ACDMeasurement:
         """
         Parse binary measurement result
         
@@ -200,23 +382,39 @@ class ACDProtocol:
         SCAN: num_points(4), [freq(8), level(4)]*N
         """
         try:
-            result = {'format': 'binary'}
+            result = ACDMeasurement(format='binary')
             
-            # Try to parse as FFM first (common format)
-            if len(payload) >= 24:
-                freq, level, bw, timestamp = struct.unpack('>dffQ', payload[:24])
-                result.update({
-                    'frequency': freq,
+            # SCAN: the point count must account for the whole payload
+            if len(payload) >= _SCAN_COUNT.size:
+                (num_points,) = _SCAN_COUNT.unpack_from(payload, 0)
+                if num_points and len(payload) == _SCAN_COUNT.size + num_points * _SCAN_POINT.itemsize:
+                    # Decode all points with one vectorized copy instead of a per-point loop
+                    points = np.frombuffer(
+                        payload, dtype=_SCAN_POINT, count=num_points, offset=_SCAN_COUNT.size
+                    )
+                    result.measurement_type = 'SCAN'
+                    result.extra = {
+                        'num_points': num_points,
+                        'frequencies': points['freq'].tolist(),
+                        'levels_dbm': points['level'].tolist(),
+                    }
+                    return result
+            
+            # Otherwise parse as FFM (common format)
+            if len(payload) >= _FFM.size:
+                freq, level, bw, timestamp = _FFM.unpack_from(payload, 0)
+                result.frequency = freq
+                result.bandwidth = bw
+                result.extra = {
                     'level_dbm': level,
-                    'bandwidth': bw,
                     'timestamp': timestamp,
-                })
+                }
                 
             return result
             
         except Exception as e:
             logger.error(f"Error parsing binary result: {e}")
-            return {'error': str(e), 'raw_hex': payload.hex()}
+            return ACDMeasurement(format='binary', extra={'error': str(e), 'raw_hex': _LazyHex(payload)})
             
     async def send_command(self, command: str, target_addr: tuple):
         """
@@ -227,21 +425,25 @@ class ACDProtocol:
             target_addr: Target address (host, port)
         """
         try:
-            if not self.socket:
-                raise RuntimeError("Socket not initialized")
+            if not self.transport:
+                raise RuntimeError("Transport not initialized")
                 
             # Create ACD message
             msg_type = 0x10  # Command type
             payload = command.encode('utf-8')
             msg_length = len(payload)
-            seq_num = int(datetime.now().timestamp() * 1000) % 0xFFFFFFFF
+            self._seq = (self._seq + 1) & 0x7FFFFFFF
+            seq_num = self._seq
             
-            # Pack header
-            header = struct.pack('>IHHi', 0x41434400, msg_type, msg_length, seq_num)
+            # Pack header and payload into the shared send buffer. Nothing
+            # awaits between packing and sendto, and the transport copies
+            # anything it has to queue, so the buffer can be reused right away.
+            end = _HDR.size + msg_length
+            _HDR.pack_into(self._send_buf, 0, 0x41434400, msg_type, msg_length, seq_num)
+            self._send_buf[_HDR.size:end] = payload
             
             # Send
-            message = header + payload
-            self.socket.sendto(message, target_addr)
+            self.transport.sendto(self._send_view[:end], target_addr)
             
             logger.info(f"Sent command to {target_addr}: {command[:100]}...")
             
@@ -251,14 +453,21 @@ class ACDProtocol:
     async def stop(self):
         """Stop UDP listener"""
         self.running = False
-        if self.socket:
-            self.socket.close()
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        if self.transport:
+            self.transport.close()
+            self.transport = None
         logger.info("ACD UDP listener stopped")
 
 
 class ACDManager:
     """Manager for ACD connections and measurements"""
     
+    # Window used to coalesce measurement inserts into one insert_many
+    FLUSH_INTERVAL = 0.01
+    
     def __init__(self, db, port: int = 9876):
         """
         Initialize ACD Manager
@@ -272,13 +481,15 @@ class ACDManager:
         self.protocol: Optional[ACDProtocol] = None
         self.measurement_handlers: Dict[str, Callable] = {}
         
+        self._writer = BatchWriter(self._save_measurements, "ACD measurements", self.FLUSH_INTERVAL)
+        
     async def start(self):
         """Start ACD manager"""
         self.protocol = ACDProtocol(port=self.port)
         self.protocol.set_callback(self._handle_measurement)
         await self.protocol.start()
         
-    async def _handle_measurement(self, result: Dict[str, Any]):
+    async def _handle_measurement(self, result: ACDMeasurement):
         """
         Handle received measurement result
         
@@ -286,19 +497,24 @@ class ACDManager:
             result: Parsed measurement result
         """
         try:
-            logger.info(f"Received measurement: {result.get('order_id', 'unknown')}")
+            logger.info("Received measurement: %s", result.order_id or 'unknown')
             
-            # Save to database
-            await self.db.acd_measurements.insert_one(result)
+            # Queue for the next batched database write
+            self._writer.add(result)
             
             # Call registered handlers
-            order_id = result.get('order_id')
+            order_id = result.order_id
             if order_id in self.measurement_handlers:
                 await self.measurement_handlers[order_id](result)
                 
         except Exception as e:
             logger.error(f"Error handling measurement: {e}")
             
+    async def _save_measurements(self, batch: List[ACDMeasurement]):
+        """Insert a batch of measurements with a single unordered insert_many"""
+        documents = [result.to_document() for result in batch]
+        await self.db.acd_measurements.insert_many(documents, ordered=False)
+            
     def register_handler(self, order_id: str, handler: Callable):
         """Register handler for specific order"""
         self.measurement_handlers[order_id] = handler
@@ -311,3 +527,5 @@ class ACDManager:
         """Stop ACD manager"""
         if self.protocol:
             await self.protocol.stop()
+        # Write anything still waiting for the next flush
+        await self._writer.stop()
@@ -5,18 +5,68 @@ Admin-only endpoints for AD configuration and testing
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
+import asyncio
 import logging
+import time
 from datetime import datetime
 
 from auth import get_current_user, require_admin
 from models import User
-from auth_ad import ad_authenticator
+from auth_ad import ad_authenticator, AD_SENSITIVE_FIELDS
 from crypto_utils import get_encryption
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/ad", tags=["Active Directory"])
 
+# Will be set by main server during initialization
+db = None
+encryption = None
+
+
+def set_dependencies(database):
+    """Set database dependency and resolve the config encryption instance"""
+    global db, encryption
+    db = database
+    # Derive the encryption key at startup rather than in the first request
+    encryption = get_encryption()
+
+
+# Short-lived caches so status polling doesn't rebind to AD on every request
+_CONFIG_TTL = 10  # seconds
+_CONNECTION_TTL = 30  # seconds
+_config_cache: Dict[str, Any] = {'t': 0.0, 'v': None}
+_connection_cache: Dict[str, Any] = {'t': 0.0, 'v': None}
+
+
+def _get_cached_config() -> Dict[str, Any]:
+    """Return the sanitized AD config, refreshed at most every _CONFIG_TTL seconds"""
+    now = time.monotonic()
+    if _config_cache['v'] is None or now - _config_cache['t'] > _CONFIG_TTL:
+        _config_cache.update(t=now, v=ad_authenticator.get_config())
+    return _config_cache['v']
+
+
+async def _get_cached_connection_test(force: bool = False) -> Dict[str, Any]:
+    """
+    Return the AD connection test result, refreshed at most every _CONNECTION_TTL seconds
+    
+    The LDAP bind is blocking, so it runs in the default executor.
+    """
+    now = time.monotonic()
+    if force or _connection_cache['v'] is None or now - _connection_cache['t'] > _CONNECTION_TTL:
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, ad_authenticator.test_connection
+        )
+        _connection_cache.update(t=time.monotonic(), v=result)
+    return _connection_cache['v']
+
+
+def _invalidate_caches():
+    """Drop cached AD config and connection status (e.g. after a config change)"""
+    _config_cache.update(t=0.0, v=None)
+    _connection_cache.update(t=0.0, v=None)
+
 
 class ADConfigRequest(BaseModel):
     """Request model for AD configuration (will be encrypted)"""
@@ -43,8 +93,8 @@ async def get_ad_status(current_user: User = Depends(require_admin)):
     Admin only
     """
     try:
-        config = ad_authenticator.get_config()
-        connection_test = ad_authenticator.test_connection()
+        config = _get_cached_config()
+        connection_test = await _get_cached_connection_test()
         
         return {
             'success': True,
@@ -63,7 +113,8 @@ async def test_ad_connection(current_user: User = Depends(require_admin)):
     Admin only
     """
     try:
-        result = ad_authenticator.test_connection()
+        # Explicit test always binds, and refreshes the cached status
+        result = await _get_cached_connection_test(force=True)
         return result
     except Exception as e:
         logger.error(f"Error testing AD connection: {str(e)}")
@@ -106,7 +157,7 @@ async def get_ad_config(current_user: User = Depends(require_admin)):
     Admin only
     """
     try:
-        config = ad_authenticator.get_config()
+        config = _get_cached_config()
         return {
             'success': True,
             'config': config
@@ -128,19 +179,11 @@ async def save_ad_config(
     All sensitive fields are encrypted before storage
     """
     try:
-        from server import db
-        
-        # Get encryption instance
-        encryption = get_encryption()
-        
-        # Fields to encrypt
-        sensitive_fields = ['server', 'domain', 'base_dn', 'bind_user', 'bind_password']
-        
         # Prepare config data
         config_data = config_request.dict()
         
         # Encrypt sensitive fields
-        encrypted_config = encryption.encrypt_dict(config_data, sensitive_fields)
+        encrypted_config = encryption.encrypt_dict(config_data, AD_SENSITIVE_FIELDS)
         
         # Add metadata
         encrypted_config['updated_at'] = datetime.utcnow().isoformat()
@@ -156,6 +199,7 @@ async def save_ad_config(
         
         # Reload AD authenticator with new config
         ad_authenticator.reload_from_database(db)
+        _invalidate_caches()
         
         logger.info(f"AD configuration saved (encrypted) by {current_user.username}")
         
@@ -183,8 +227,6 @@ async def get_encrypted_config(current_user: User = Depends(require_admin)):
     Admin only - returns actual values (decrypted)
     """
     try:
-        from server import db
-        
         # Get from database
         config_doc = await db.ad_configuration.find_one({'_id': 'ad_config'})
         
@@ -195,14 +237,8 @@ async def get_encrypted_config(current_user: User = Depends(require_admin)):
                 'config': None
             }
         
-        # Get encryption instance
-        encryption = get_encryption()
-        
-        # Fields to decrypt
-        sensitive_fields = ['server', 'domain', 'base_dn', 'bind_user', 'bind_password']
-        
         # Decrypt
-        decrypted_config = encryption.decrypt_dict(config_doc, sensitive_fields)
+        decrypted_config = encryption.decrypt_dict(config_doc, AD_SENSITIVE_FIELDS)
         
         # Remove MongoDB _id
         if '_id' in decrypted_config:
@@ -2,14 +2,22 @@
 ADC API endpoints for ORM-ADC operations
 Handles order creation and UDP capture management
 """
-from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import APIRoute
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
-from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple, Set, Callable
+from datetime import datetime, timezone
+import asyncio
 import logging
 import os
+import time
+import orjson
+from pymongo.errors import BulkWriteError
 
 from auth import get_current_user
+from batch_writer import BatchWriter
 from models import User
 from adc_order_generator import ADCOrderGenerator
 from udp_listener import UDPListener
@@ -18,7 +26,49 @@ logger = logging.getLogger(__name__)
 
 # Global UDP listener instance
 udp_listener: Optional[UDPListener] = None
-active_websockets: List[WebSocket] = []
+order_writer: Optional["OrderMetadataWriter"] = None
+active_websockets: Set[WebSocket] = set()
+
+# Fields returned by the list endpoints; full documents stay in MongoDB
+_ORDER_LIST_PROJECTION = {
+    '_id': 0, 'id': 1, 'type': 1, 'station_id': 1, 'status': 1,
+    'created_at': 1, 'created_by': 1
+}
+_CAPTURE_LIST_PROJECTION = {'_id': 0, 'data': 0}
+_MAX_CURSOR_BATCH = 200
+# MongoDB error code of a write that violates a unique index
+_DUPLICATE_KEY_ERROR = 11000
+
+# Short-lived cache for the polled list endpoints, keyed by (endpoint, limit)
+_LIST_CACHE_TTL = 5  # seconds
+_LIST_CACHE_MAX_ENTRIES = 32
+_list_cache: Dict[Tuple[str, int], Tuple[float, Dict[str, Any]]] = {}
+
+
+def _get_cached_list(endpoint: str, limit: int) -> Optional[Dict[str, Any]]:
+    """Return a cached list response if it is younger than _LIST_CACHE_TTL"""
+    entry = _list_cache.get((endpoint, limit))
+    if entry is not None and time.monotonic() - entry[0] <= _LIST_CACHE_TTL:
+        return entry[1]
+    return None
+
+
+def _set_cached_list(endpoint: str, limit: int, value: Dict[str, Any]):
+    """Store a list response in the cache, evicting expired or oldest entries when full"""
+    now = time.monotonic()
+    if (endpoint, limit) not in _list_cache and len(_list_cache) >= _LIST_CACHE_MAX_ENTRIES:
+        for key in [key for key, (stored, _) in _list_cache.items() if now - stored > _LIST_CACHE_TTL]:
+            del _list_cache[key]
+        if len(_list_cache) >= _LIST_CACHE_MAX_ENTRIES:
+            # Drop the oldest entry
+            _list_cache.pop(next(iter(_list_cache)))
+    _list_cache[(endpoint, limit)] = (now, value)
+
+
+def _invalidate_list_cache(endpoint: str):
+    """Drop every cached page of an endpoint (e.g. after new orders are written)"""
+    for key in [key for key in _list_cache if key[0] == endpoint]:
+        del _list_cache[key]
 
 
 class ScanOrderRequest(BaseModel):
@@ -34,6 +84,11 @@ class ScanOrderRequest(BaseModel):
     attenuation: str = Field("Auto", description="RF attenuation (Auto or dB value)")
 
 
+class BatchScanOrderRequest(BaseModel):
+    """Request model for submitting several SCAN orders at once"""
+    orders: List[ScanOrderRequest] = Field(..., description="SCAN orders to submit", min_length=1, max_length=500)
+
+
 class SingleFreqOrderRequest(BaseModel):
     """Request model for single frequency measurement"""
     station_id: str = Field(..., description="Target station name")
@@ -46,13 +101,201 @@ class SingleFreqOrderRequest(BaseModel):
     measurement_type: str = Field("LEVEL", description="Measurement type: LEVEL, DF, DEMOD, SPECTRUM")
 
 
+class CaptureBroadcaster:
+    """
+    Fans UDP captures out to the stream WebSocket clients from one task
+    
+    The UDP listener only enqueues; a single background task drains the
+    queue, encodes once and sends to every client. Captures that pile up
+    while a send is in flight go out together as one 'capture.batch' frame.
+    """
+    
+    # Bounded queue so a burst can't grow memory without limit
+    QUEUE_MAXSIZE = 1024
+    # Most captures combined into a single frame
+    BATCH_MAX = 32
+    
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.dropped_count = 0
+        self._last_drop_log = 0.0
+    
+    def start(self):
+        """Start the broadcast task (no-op if already running)"""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue(maxsize=self.QUEUE_MAXSIZE)
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the broadcast task and discard anything still queued"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._queue = None
+    
+    def enqueue(self, capture_data: Dict[str, Any]):
+        """Queue a capture for broadcast, dropping it if the queue is full"""
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(capture_data)
+        except asyncio.QueueFull:
+            self.dropped_count += 1
+            # Rate-limit the warning to once per second
+            now = time.monotonic()
+            if now - self._last_drop_log >= 1.0:
+                self._last_drop_log = now
+                logger.warning(f"Capture broadcast queue full, {self.dropped_count} captures dropped so far")
+    
+    async def _run(self):
+        """Drain the queue and broadcast captures until cancelled"""
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.BATCH_MAX:
+                try:
+                    batch.append(queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            
+            if len(batch) == 1:
+                message = {'event': 'capture.received', 'data': batch[0]}
+            else:
+                message = {'event': 'capture.batch', 'data': batch}
+            
+            try:
+                await self._send(message)
+            except Exception as e:
+                logger.error(f"Capture broadcast error: {str(e)}")
+    
+    async def _send(self, message: Dict[str, Any]):
+        """Encode once and send to a snapshot of the clients in parallel"""
+        if not active_websockets:
+            return
+        
+        payload = orjson.dumps(message).decode('utf-8')
+        clients = list(active_websockets)
+        results = await asyncio.gather(
+            *(ws.send_text(payload) for ws in clients),
+            return_exceptions=True
+        )
+        
+        disconnected = set()
+        for ws, result in zip(clients, results):
+            if isinstance(result, Exception):
+                logger.warning(f"WebSocket send failed: {str(result)}")
+                disconnected.add(ws)
+        
+        # Remove disconnected clients
+        active_websockets.difference_update(disconnected)
+
+
+capture_broadcaster = CaptureBroadcaster()
+
+
+class OrderMetadataWriter(BatchWriter):
+    """
+    Stores ADC order metadata in MongoDB outside the request path
+    
+    Order endpoints return once the XML is in the INBOX; their metadata
+    documents are queued here and written in batches with insert_many.
+    The orders already exist in Argus, so a failed write is retried.
+    """
+    
+    # Window used to coalesce order inserts into one insert_many
+    FLUSH_INTERVAL = 0.05
+    MAX_RETRIES = 5
+    
+    def __init__(self, db):
+        super().__init__(self._save_orders, "ADC order metadata", self.FLUSH_INTERVAL,
+                         max_retries=self.MAX_RETRIES)
+        self.db = db
+    
+    async def _save_orders(self, batch: List[Dict[str, Any]]):
+        """Insert a batch of orders with a single unordered insert_many"""
+        try:
+            await self.db.adc_orders.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # insert_many gave each document an _id, so on a retry the orders
+            # saved by the failed attempt come back as duplicate keys
+            details = e.details
+            if details.get('writeConcernErrors') or any(
+                error.get('code') != _DUPLICATE_KEY_ERROR for error in details.get('writeErrors', [])
+            ):
+                raise
+        # New orders are visible now, drop any cached order list
+        _invalidate_list_cache('orders')
+    
+    def _dropped(self, batch: List[Dict[str, Any]], error: Exception):
+        """Log the ids of orders that are in Argus but may have no metadata record"""
+        logger.error(
+            f"Error saving ADC order metadata, orders {[doc.get('id') for doc in batch]} may "
+            f"have no record: {str(error)}"
+        )
+
+
+class ADCRoute(APIRoute):
+    """
+    Route class that turns unexpected endpoint errors into logged 500s
+    
+    Lets the ADC endpoints stay straight-line instead of each wrapping its
+    body in try/except; HTTPException and validation errors pass through.
+    """
+    
+    def get_route_handler(self) -> Callable:
+        original_handler = super().get_route_handler()
+        
+        async def handler(request: Request):
+            try:
+                return await original_handler(request)
+            except (HTTPException, RequestValidationError):
+                raise
+            except Exception as e:
+                logger.error(f"Error handling {request.method} {request.url.path}: {str(e)}")
+                return ORJSONResponse(status_code=500, content={'detail': str(e)})
+        
+        return handler
+
+
+async def ensure_indexes(db):
+    """
+    Create indexes backing the ADC list endpoints
+    
+    The order and capture lists are sorted newest-first, so descending
+    indexes on their sort keys let MongoDB walk the index instead of
+    sorting the collection. create_index is idempotent.
+    """
+    try:
+        await db.adc_orders.create_index([('created_at', -1)])
+        await db.captures_raw.create_index([('timestamp', -1)])
+        logger.info("ADC indexes ensured")
+    except Exception as e:
+        logger.warning(f"Could not create ADC indexes: {str(e)}")
+
+
 def create_adc_router(db, adc_generator: ADCOrderGenerator) -> APIRouter:
-    """Create and configure ADC API router"""
+    """
+    Create and configure ADC API router
+    
+    `db` must come from the shared client in database.py; the router never
+    opens its own MongoDB connection.
+    """
     
-    router = APIRouter(prefix="/api/adc", tags=["ADC"])
+    router = APIRouter(
+        prefix="/api/adc",
+        tags=["ADC"],
+        default_response_class=ORJSONResponse,
+        route_class=ADCRoute
+    )
     
-    global udp_listener
+    global udp_listener, order_writer
     udp_listener = UDPListener(port=4090, db=db)
+    order_writer = OrderMetadataWriter(db)
     
     @router.post("/orders/scan")
     async def create_scan_order(
@@ -66,71 +309,111 @@ def create_adc_router(db, adc_generator: ADCOrderGenerator) -> APIRouter:
         and writes it to the Argus INBOX directory where it will be
         automatically detected and executed.
         """
-        try:
-            # Validate frequency range
-            if request.freq_stop <= request.freq_start:
+        # Validate frequency range
+        if request.freq_stop <= request.freq_start:
+            raise HTTPException(
+                status_code=400,
+                detail="Stop frequency must be greater than start frequency"
+            )
+        
+        # One timestamp for the order ID, XML header, filename and metadata
+        now = datetime.now(timezone.utc)
+        order_id = adc_generator.generate_order_id(prefix="SCAN", now=now)
+        params = request.model_dump()
+        
+        # Write XML order to INBOX off the event loop
+        result = await asyncio.to_thread(
+            adc_generator.submit_scan_order, order_id, created_at=now, **params
+        )
+        
+        if not result['success']:
+            raise HTTPException(status_code=500, detail=result.get('error', 'Failed to save order'))
+        
+        # Queue order metadata for MongoDB; Argus only needs the INBOX file
+        order_writer.add({
+            'id': order_id,
+            'type': 'SCAN',
+            **params,
+            'created_by': current_user.username,
+            'created_at': now.isoformat(),
+            'status': 'submitted',
+            'inbox_path': result['inbox_path']
+        })
+        
+        logger.info(f"SCAN order created: {order_id} by {current_user.username}")
+        
+        return {
+            'success': True,
+            'order_id': order_id,
+            'order_type': 'SCAN',
+            'station_id': request.station_id,
+            'freq_range': f"{request.freq_start/1e6:.3f} - {request.freq_stop/1e6:.3f} MHz",
+            'inbox_path': result['inbox_path'],
+            'message': 'Order submitted to Argus INBOX successfully'
+        }
+    
+    @router.post("/orders/scan/batch")
+    async def create_scan_orders_batch(
+        request: BatchScanOrderRequest,
+        current_user: User = Depends(get_current_user)
+    ):
+        """
+        Create and submit several SCAN orders to Argus INBOX
+        
+        All order files are written concurrently and their metadata is
+        queued for a single batched MongoDB insert. Orders in the batch share the
+        batch timestamp and get a sequence suffix to keep their IDs unique.
+        """
+        for index, order in enumerate(request.orders):
+            if order.freq_stop <= order.freq_start:
                 raise HTTPException(
                     status_code=400,
-                    detail="Stop frequency must be greater than start frequency"
+                    detail=f"Order {index}: stop frequency must be greater than start frequency"
                 )
-            
-            # Generate order ID
-            order_id = adc_generator.generate_order_id(prefix="SCAN")
-            
-            # Create XML order
-            xml_order = adc_generator.create_scan_order(
-                order_id=order_id,
-                station_id=request.station_id,
-                freq_start=request.freq_start,
-                freq_stop=request.freq_stop,
-                freq_step=request.freq_step,
-                bandwidth=request.bandwidth,
-                detector=request.detector,
-                priority=request.priority,
-                meas_time=request.meas_time,
-                attenuation=request.attenuation
+        
+        now = datetime.now(timezone.utc)
+        batch_id = adc_generator.generate_order_id(prefix="SCAN", now=now)
+        order_ids = [f"{batch_id}_{index:03d}" for index in range(len(request.orders))]
+        params_list = [order.model_dump() for order in request.orders]
+        
+        # Write all XML orders to INBOX concurrently
+        results = await asyncio.gather(*(
+            asyncio.to_thread(
+                adc_generator.submit_scan_order, order_id, created_at=now, **params
             )
-            
-            # Save to INBOX
-            result = adc_generator.save_order_to_inbox(xml_order, order_id)
-            
+            for order_id, params in zip(order_ids, params_list)
+        ))
+        
+        created_at = now.isoformat()
+        docs = []
+        failed = []
+        for order_id, params, result in zip(order_ids, params_list, results):
             if not result['success']:
-                raise HTTPException(status_code=500, detail=result.get('error', 'Failed to save order'))
-            
-            # Store order metadata in MongoDB
-            await db.adc_orders.insert_one({
+                failed.append({'order_id': order_id, 'error': result.get('error', 'Failed to save order')})
+                continue
+            docs.append({
                 'id': order_id,
                 'type': 'SCAN',
-                'station_id': request.station_id,
-                'freq_start': request.freq_start,
-                'freq_stop': request.freq_stop,
-                'freq_step': request.freq_step,
-                'bandwidth': request.bandwidth,
-                'detector': request.detector,
-                'priority': request.priority,
+                **params,
                 'created_by': current_user.username,
-                'created_at': datetime.utcnow().isoformat(),
+                'created_at': created_at,
                 'status': 'submitted',
                 'inbox_path': result['inbox_path']
             })
-            
-            logger.info(f"SCAN order created: {order_id} by {current_user.username}")
-            
-            return {
-                'success': True,
-                'order_id': order_id,
-                'order_type': 'SCAN',
-                'station_id': request.station_id,
-                'freq_range': f"{request.freq_start/1e6:.3f} - {request.freq_stop/1e6:.3f} MHz",
-                'inbox_path': result['inbox_path'],
-                'message': 'Order submitted to Argus INBOX successfully'
-            }
-            
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.error(f"Error creating SCAN order: {str(e)}")
-            raise HTTPException(status_code=500, detail=str(e))
+        
+        # Queue all order metadata; the writer stores it in one round trip
+        for doc in docs:
+            order_writer.add(doc)
+        
+        logger.info(f"SCAN batch {batch_id} created: {len(docs)} submitted, {len(failed)} failed by {current_user.username}")
+        
+        return {
+            'success': not failed,
+            'order_ids': [doc['id'] for doc in docs],
+            'submitted': len(docs),
+            'failed': failed,
+            'message': f"{len(docs)} of {len(order_ids)} orders submitted to Argus INBOX"
+        }
     
     @router.post("/orders/single-freq")
     async def create_single_freq_order(
@@ -143,62 +426,41 @@ def create_adc_router(db, adc_generator: ADCOrderGenerator) -> APIRouter:
         This generates an ADC-compatible XML order for measuring a single
         frequency and writes it to the Argus INBOX directory.
         """
-        try:
-            # Generate order ID
-            order_id = adc_generator.generate_order_id(prefix="MEAS")
-            
-            # Create XML order
-            xml_order = adc_generator.create_single_freq_order(
-                order_id=order_id,
-                station_id=request.station_id,
-                frequency=request.frequency,
-                bandwidth=request.bandwidth,
-                detector=request.detector,
-                priority=request.priority,
-                meas_time=request.meas_time,
-                attenuation=request.attenuation,
-                measurement_type=request.measurement_type
-            )
-            
-            # Save to INBOX
-            result = adc_generator.save_order_to_inbox(xml_order, order_id)
-            
-            if not result['success']:
-                raise HTTPException(status_code=500, detail=result.get('error', 'Failed to save order'))
-            
-            # Store order metadata in MongoDB
-            await db.adc_orders.insert_one({
-                'id': order_id,
-                'type': 'SINGLE_FREQ',
-                'station_id': request.station_id,
-                'frequency': request.frequency,
-                'bandwidth': request.bandwidth,
-                'detector': request.detector,
-                'measurement_type': request.measurement_type,
-                'priority': request.priority,
-                'created_by': current_user.username,
-                'created_at': datetime.utcnow().isoformat(),
-                'status': 'submitted',
-                'inbox_path': result['inbox_path']
-            })
-            
-            logger.info(f"Single freq order created: {order_id} by {current_user.username}")
-            
-            return {
-                'success': True,
-                'order_id': order_id,
-                'order_type': 'SINGLE_FREQ',
-                'station_id': request.station_id,
-                'frequency': f"{request.frequency/1e6:.3f} MHz",
-                'inbox_path': result['inbox_path'],
-                'message': 'Order submitted to Argus INBOX successfully'
-            }
-            
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.error(f"Error creating single freq order: {str(e)}")
-            raise HTTPException(status_code=500, detail=str(e))
+        # One timestamp for the order ID, XML header, filename and metadata
+        now = datetime.now(timezone.utc)
+        order_id = adc_generator.generate_order_id(prefix="MEAS", now=now)
+        params = request.model_dump()
+        
+        # Write XML order to INBOX off the event loop
+        result = await asyncio.to_thread(
+            adc_generator.submit_single_freq_order, order_id, created_at=now, **params
+        )
+        
+        if not result['success']:
+            raise HTTPException(status_code=500, detail=result.get('error', 'Failed to save order'))
+        
+        # Queue order metadata for MongoDB; Argus only needs the INBOX file
+        order_writer.add({
+            'id': order_id,
+            'type': 'SINGLE_FREQ',
+            **params,
+            'created_by': current_user.username,
+            'created_at': now.isoformat(),
+            'status': 'submitted',
+            'inbox_path': result['inbox_path']
+        })
+        
+        logger.info(f"Single freq order created: {order_id} by {current_user.username}")
+        
+        return {
+            'success': True,
+            'order_id': order_id,
+            'order_type': 'SINGLE_FREQ',
+            'station_id': request.station_id,
+            'frequency': f"{request.frequency/1e6:.3f} MHz",
+            'inbox_path': result['inbox_path'],
+            'message': 'Order submitted to Argus INBOX successfully'
+        }
     
     @router.post("/capture/start")
     async def start_udp_capture(current_user: User = Depends(get_current_user)):
@@ -208,52 +470,37 @@ def create_adc_router(db, adc_generator: ADCOrderGenerator) -> APIRouter:
         Begins listening on UDP port 4090 for measurement results from Argus.
         Only one capture session can be active at a time.
         """
-        try:
-            global udp_listener
-            
-            if udp_listener.is_running():
-                return {
-                    'success': True,
-                    'message': 'UDP capture already running',
-                    'port': 4090,
-                    'status': 'active'
-                }
-            
-            # Start UDP listener with WebSocket broadcast callback
-            async def broadcast_callback(capture_data: Dict[str, Any]):
-                """Broadcast capture data to all connected WebSocket clients"""
-                if active_websockets:
-                    message = {
-                        'event': 'capture.received',
-                        'data': capture_data
-                    }
-                    
-                    disconnected = []
-                    for ws in active_websockets:
-                        try:
-                            await ws.send_json(message)
-                        except Exception as e:
-                            logger.warning(f"WebSocket send failed: {str(e)}")
-                            disconnected.append(ws)
-                    
-                    # Remove disconnected clients
-                    for ws in disconnected:
-                        active_websockets.remove(ws)
-            
-            await udp_listener.start(callback=broadcast_callback)
-            
-            logger.info(f"UDP capture started by {current_user.username}")
-            
+        global udp_listener
+        
+        if udp_listener.is_running():
             return {
                 'success': True,
-                'message': 'UDP capture started successfully',
+                'message': 'UDP capture already running',
                 'port': 4090,
                 'status': 'active'
             }
-            
-        except Exception as e:
-            logger.error(f"Error starting UDP capture: {str(e)}")
-            raise HTTPException(status_code=500, detail=str(e))
+        
+        # Start UDP listener; captures are handed to the broadcaster queue so
+        # the receive loop never waits on WebSocket clients
+        capture_broadcaster.start()
+        
+        async def broadcast_callback(capture_data: Dict[str, Any]):
+            """Queue capture data for the connected WebSocket clients"""
+            # The capture is stored by now, drop any cached capture list
+            _invalidate_list_cache('captures')
+            if active_websockets:
+                capture_broadcaster.enqueue(capture_data)
+        
+        await udp_listener.start(callback=broadcast_callback)
+        
+        logger.info(f"UDP capture started by {current_user.username}")
+        
+        return {
+            'success': True,
+            'message': 'UDP capture started successfully',
+            'port': 4090,
+            'status': 'active'
+        }
     
     @router.post("/capture/stop")
     async def stop_udp_capture(current_user: User = Depends(get_current_user)):
@@ -262,37 +509,33 @@ def create_adc_router(db, adc_generator: ADCOrderGenerator) -> APIRouter:
         
         Stops the UDP listener and closes all WebSocket connections.
         """
-        try:
-            global udp_listener
-            
-            if not udp_listener.is_running():
-                return {
-                    'success': True,
-                    'message': 'UDP capture not running',
-                    'status': 'inactive'
-                }
-            
-            await udp_listener.stop()
-            
-            # Close all WebSocket connections
-            for ws in active_websockets[:]:
-                try:
-                    await ws.close()
-                except:
-                    pass
-                active_websockets.remove(ws)
-            
-            logger.info(f"UDP capture stopped by {current_user.username}")
-            
+        global udp_listener
+        
+        if not udp_listener.is_running():
             return {
                 'success': True,
-                'message': 'UDP capture stopped successfully',
+                'message': 'UDP capture not running',
                 'status': 'inactive'
             }
-            
-        except Exception as e:
-            logger.error(f"Error stopping UDP capture: {str(e)}")
-            raise HTTPException(status_code=500, detail=str(e))
+        
+        await udp_listener.stop()
+        await capture_broadcaster.stop()
+        
+        # Close all WebSocket connections
+        for ws in list(active_websockets):
+            try:
+                await ws.close()
+            except:
+                pass
+            active_websockets.discard(ws)
+        
+        logger.info(f"UDP capture stopped by {current_user.username}")
+        
+        return {
+            'success': True,
+            'message': 'UDP capture stopped successfully',
+            'status': 'inactive'
+        }
     
     @router.get("/capture/status")
     async def get_capture_status(current_user: User = Depends(get_current_user)):
@@ -305,51 +548,68 @@ def create_adc_router(db, adc_generator: ADCOrderGenerator) -> APIRouter:
             'status': 'active' if is_running else 'inactive',
             'port': 4090,
             'is_listening': is_running,
-            'websocket_clients': len(active_websockets)
+            'websocket_clients': len(active_websockets),
+            'broadcast_dropped': capture_broadcaster.dropped_count
         }
     
     @router.get("/orders")
     async def get_adc_orders(
-        limit: int = 50,
+        limit: int = Query(50, ge=1, le=_MAX_CURSOR_BATCH),
         current_user: User = Depends(get_current_user)
     ):
         """Get list of ADC orders"""
-        try:
-            orders = await db.adc_orders.find().sort('created_at', -1).limit(limit).to_list(length=limit)
-            
-            # Convert MongoDB documents to JSON-serializable format
-            for order in orders:
-                if '_id' in order:
-                    del order['_id']  # Remove MongoDB ObjectId
-            
-            return {
-                'success': True,
-                'orders': orders,
-                'count': len(orders)
-            }
-            
-        except Exception as e:
-            logger.error(f"Error fetching ADC orders: {str(e)}")
-            raise HTTPException(status_code=500, detail=str(e))
+        cached = _get_cached_list('orders', limit)
+        if cached is not None:
+            return cached
+        
+        cursor = db.adc_orders.find({}, _ORDER_LIST_PROJECTION).sort('created_at', -1)
+        orders = await cursor.batch_size(min(limit, _MAX_CURSOR_BATCH)).limit(limit).to_list(length=limit)
+        
+        result = {
+            'success': True,
+            'orders': orders,
+            'count': len(orders)
+        }
+        _set_cached_list('orders', limit, result)
+        return result
     
     @router.get("/captures")
     async def get_captures(
-        limit: int = 100,
+        limit: int = Query(100, ge=1, le=_MAX_CURSOR_BATCH),
         current_user: User = Depends(get_current_user)
     ):
         """Get list of captured UDP data"""
-        try:
-            captures = await db.captures_raw.find().sort('timestamp', -1).limit(limit).to_list(length=limit)
-            
-            return {
-                'success': True,
-                'captures': captures,
-                'count': len(captures)
-            }
-            
-        except Exception as e:
-            logger.error(f"Error fetching captures: {str(e)}")
-            raise HTTPException(status_code=500, detail=str(e))
+        cached = _get_cached_list('captures', limit)
+        if cached is not None:
+            return cached
+        
+        # Parsed payloads are left out of the list; fetch /captures/{id} for details
+        cursor = db.captures_raw.find({}, _CAPTURE_LIST_PROJECTION).sort('timestamp', -1)
+        captures = await cursor.batch_size(min(limit, _MAX_CURSOR_BATCH)).limit(limit).to_list(length=limit)
+        
+        result = {
+            'success': True,
+            'captures': captures,
+            'count': len(captures)
+        }
+        _set_cached_list('captures', limit, result)
+        return result
+    
+    @router.get("/captures/{capture_id}")
+    async def get_capture(
+        capture_id: str,
+        current_user: User = Depends(get_current_user)
+    ):
+        """Get a single UDP capture including its parsed data"""
+        capture = await db.captures_raw.find_one({'id': capture_id}, {'_id': 0})
+        
+        if not capture:
+            raise HTTPException(status_code=404, detail="Capture not found")
+        
+        return {
+            'success': True,
+            'capture': capture
+        }
     
     @router.websocket("/ws/stream")
     async def websocket_endpoint(websocket: WebSocket):
@@ -359,35 +619,29 @@ def create_adc_router(db, adc_generator: ADCOrderGenerator) -> APIRouter:
         Clients connect here to receive real-time updates of captured UDP data.
         """
         await websocket.accept()
-        active_websockets.append(websocket)
+        active_websockets.add(websocket)
         
         logger.info(f"WebSocket client connected, total clients: {len(active_websockets)}")
         
         try:
             # Send initial status
-            await websocket.send_json({
+            await websocket.send_text(orjson.dumps({
                 'event': 'connected',
                 'message': 'Connected to ADC data stream',
                 'capture_status': 'active' if udp_listener.is_running() else 'inactive'
-            })
+            }).decode('utf-8'))
+            
+            # Keepalive is handled by uvicorn's protocol-level ping frames,
+            # so just wait here until the client goes away
+            while (await websocket.receive())['type'] != 'websocket.disconnect':
+                pass
             
-            # Keep connection alive
-            while True:
-                # Wait for messages from client (ping/pong)
-                try:
-                    data = await websocket.receive_text()
-                    if data == 'ping':
-                        await websocket.send_json({'event': 'pong'})
-                except WebSocketDisconnect:
-                    break
-                    
         except WebSocketDisconnect:
             pass
         except Exception as e:
             logger.error(f"WebSocket error: {str(e)}")
         finally:
-            if websocket in active_websockets:
-                active_websockets.remove(websocket)
+            active_websockets.discard(websocket)
             logger.info(f"WebSocket client disconnected, remaining clients: {len(active_websockets)}")
     
     return router
@@ -2,17 +2,70 @@
 ADC Order Generator for R&S Argus
 Generates ADC-compatible XML orders according to ORM manual chapter 8
 Orders are written to Argus INBOX directory (file-based, not TCP)
+
+Fully annotated so it can optionally be compiled with mypyc
+(`mypyc adc_order_generator.py`); the compiled module is a drop-in for this file.
 """
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+from xml.sax.saxutils import escape
 from typing import Dict, Any, Optional
 from datetime import datetime, timezone
 from pathlib import Path
 import logging
+import os
+import shutil
 import uuid
 
 logger = logging.getLogger(__name__)
 
+ADC_NAMESPACE = "http://www.rohde-schwarz.com/ARGUS/ORM_ADC"
+
+# ADC order layouts are fixed, so orders are rendered from static templates
+# rather than rebuilt element by element for every request
+SCAN_TEMPLATE = (
+    "<?xml version='1.0' encoding='utf-8'?>\n"
+    '<ORDER xmlns="' + ADC_NAMESPACE + '">\n'
+    "  <HEADER>\n"
+    "    <CMD>SCAN</CMD>\n"
+    "    <ID>{order_id}</ID>\n"
+    "    <STATION>{station_id}</STATION>\n"
+    "    <ORDER_TYPE>ADC</ORDER_TYPE>\n"
+    "    <PRIORITY>{priority}</PRIORITY>\n"
+    "    <TIMESTAMP>{timestamp}</TIMESTAMP>\n"
+    "  </HEADER>\n"
+    "  <BODY>\n"
+    '    <FREQ_START unit="Hz">{freq_start}</FREQ_START>\n'
+    '    <FREQ_STOP unit="Hz">{freq_stop}</FREQ_STOP>\n'
+    '    <FREQ_STEP unit="Hz">{freq_step}</FREQ_STEP>\n'
+    '    <BANDWIDTH unit="Hz">{bandwidth}</BANDWIDTH>\n'
+    "    <DETECTOR>{detector}</DETECTOR>\n"
+    '    <MEAS_TIME unit="ms">{meas_time}</MEAS_TIME>\n'
+    "    <ATTENUATION>{attenuation}</ATTENUATION>\n"
+    "  </BODY>\n"
+    "</ORDER>\n"
+)
+
+SINGLE_FREQ_TEMPLATE = (
+    "<?xml version='1.0' encoding='utf-8'?>\n"
+    '<ORDER xmlns="' + ADC_NAMESPACE + '">\n'
+    "  <HEADER>\n"
+    "    <CMD>MEASURE</CMD>\n"
+    "    <ID>{order_id}</ID>\n"
+    "    <STATION>{station_id}</STATION>\n"
+    "    <ORDER_TYPE>ADC</ORDER_TYPE>\n"
+    "    <PRIORITY>{priority}</PRIORITY>\n"
+    "    <TIMESTAMP>{timestamp}</TIMESTAMP>\n"
+    "  </HEADER>\n"
+    "  <BODY>\n"
+    '    <FREQUENCY unit="Hz">{frequency}</FREQUENCY>\n'
+    '    <BANDWIDTH unit="Hz">{bandwidth}</BANDWIDTH>\n'
+    "    <DETECTOR>{detector}</DETECTOR>\n"
+    '    <MEAS_TIME unit="ms">{meas_time}</MEAS_TIME>\n'
+    "    <ATTENUATION>{attenuation}</ATTENUATION>\n"
+    "    <MEAS_TYPE>{measurement_type}</MEAS_TYPE>\n"
+    "  </BODY>\n"
+    "</ORDER>\n"
+)
+
 class ADCOrderGenerator:
     """Generates ADC-compatible XML orders for Argus"""
     
@@ -27,17 +80,17 @@ class ADCOrderGenerator:
         
         logger.info(f"ADC Order Generator initialized: INBOX={inbox_path}")
     
-    def generate_order_id(self, prefix: str = "ADC") -> str:
+    def generate_order_id(self, prefix: str = "ADC", now: Optional[datetime] = None) -> str:
         """
         Generate unique order ID
         Format: PREFIX_YYMMDD_HHMMSSXXX
         Example: ADC_250115_143022456
+        
+        Pass `now` to reuse the request's timestamp for the INBOX filename;
+        aware datetimes are rendered in local time.
         """
-        now = datetime.now()
-        date_part = now.strftime("%y%m%d")
-        time_part = now.strftime("%H%M%S")
-        counter = now.strftime("%f")[:3]
-        return f"{prefix}_{date_part}_{time_part}{counter}"
+        now = datetime.now() if now is None else now.astimezone()
+        return f"{prefix}_{now:%y%m%d_%H%M%S}{now.microsecond // 1000:03d}"
     
     def create_scan_order(
         self,
@@ -50,7 +103,8 @@ class ADCOrderGenerator:
         detector: str = "RMS",
         priority: int = 1,
         meas_time: float = -1,
-        attenuation: str = "Auto"
+        attenuation: str = "Auto",
+        created_at: Optional[datetime] = None
     ) -> str:
         """
         Create ADC SCAN order XML
@@ -66,38 +120,24 @@ class ADCOrderGenerator:
             priority: Order priority (1=LOW, 2=NORMAL, 3=HIGH)
             meas_time: Measurement time (-1 for auto)
             attenuation: RF attenuation ("Auto" or dB value)
+            created_at: Order timestamp for the header (defaults to now)
             
         Returns:
             XML string
         """
-        # Create root with ADC namespace
-        root = ET.Element("ORDER")
-        root.set("xmlns", "http://www.rohde-schwarz.com/ARGUS/ORM_ADC")
-        
-        # HEADER
-        header = ET.SubElement(root, "HEADER")
-        ET.SubElement(header, "CMD").text = "SCAN"
-        ET.SubElement(header, "ID").text = order_id
-        ET.SubElement(header, "STATION").text = station_id
-        ET.SubElement(header, "ORDER_TYPE").text = "ADC"
-        ET.SubElement(header, "PRIORITY").text = str(priority)
-        ET.SubElement(header, "TIMESTAMP").text = datetime.now(timezone.utc).isoformat()
-        
-        # BODY with measurement parameters
-        body = ET.SubElement(root, "BODY")
-        
-        # Frequency parameters
-        ET.SubElement(body, "FREQ_START", unit="Hz").text = str(int(freq_start))
-        ET.SubElement(body, "FREQ_STOP", unit="Hz").text = str(int(freq_stop))
-        ET.SubElement(body, "FREQ_STEP", unit="Hz").text = str(int(freq_step))
-        
-        # Measurement parameters
-        ET.SubElement(body, "BANDWIDTH", unit="Hz").text = str(int(bandwidth))
-        ET.SubElement(body, "DETECTOR").text = detector
-        ET.SubElement(body, "MEAS_TIME", unit="ms").text = str(meas_time)
-        ET.SubElement(body, "ATTENUATION").text = str(attenuation)
-        
-        return self._format_xml(root)
+        return SCAN_TEMPLATE.format(
+            order_id=escape(order_id),
+            station_id=escape(station_id),
+            priority=int(priority),
+            timestamp=self._utc_isoformat(created_at),
+            freq_start=int(freq_start),
+            freq_stop=int(freq_stop),
+            freq_step=int(freq_step),
+            bandwidth=int(bandwidth),
+            detector=escape(detector),
+            meas_time=meas_time,
+            attenuation=escape(str(attenuation))
+        )
     
     def create_single_freq_order(
         self,
@@ -109,7 +149,8 @@ class ADCOrderGenerator:
         priority: int = 1,
         meas_time: float = 1000,
         attenuation: str = "Auto",
-        measurement_type: str = "LEVEL"
+        measurement_type: str = "LEVEL",
+        created_at: Optional[datetime] = None
     ) -> str:
         """
         Create ADC single frequency measurement order XML
@@ -124,67 +165,115 @@ class ADCOrderGenerator:
             meas_time: Measurement time in ms
             attenuation: RF attenuation ("Auto" or dB value)
             measurement_type: Type (LEVEL, DF, DEMOD, SPECTRUM)
+            created_at: Order timestamp for the header (defaults to now)
             
         Returns:
             XML string
         """
-        # Create root with ADC namespace
-        root = ET.Element("ORDER")
-        root.set("xmlns", "http://www.rohde-schwarz.com/ARGUS/ORM_ADC")
-        
-        # HEADER
-        header = ET.SubElement(root, "HEADER")
-        ET.SubElement(header, "CMD").text = "MEASURE"
-        ET.SubElement(header, "ID").text = order_id
-        ET.SubElement(header, "STATION").text = station_id
-        ET.SubElement(header, "ORDER_TYPE").text = "ADC"
-        ET.SubElement(header, "PRIORITY").text = str(priority)
-        ET.SubElement(header, "TIMESTAMP").text = datetime.now(timezone.utc).isoformat()
+        return SINGLE_FREQ_TEMPLATE.format(
+            order_id=escape(order_id),
+            station_id=escape(station_id),
+            priority=int(priority),
+            timestamp=self._utc_isoformat(created_at),
+            frequency=int(frequency),
+            bandwidth=int(bandwidth),
+            detector=escape(detector),
+            meas_time=meas_time,
+            attenuation=escape(str(attenuation)),
+            measurement_type=escape(measurement_type)
+        )
+    
+    def _utc_isoformat(self, created_at: Optional[datetime]) -> str:
+        """ISO 8601 UTC timestamp for the order header"""
+        if created_at is None:
+            return datetime.now(timezone.utc).isoformat()
+        return created_at.astimezone(timezone.utc).isoformat()
+    
+    def _write_atomic(self, path: Path, data: bytes) -> None:
+        """
+        Write a file so that it appears complete or not at all
         
-        # BODY
-        body = ET.SubElement(root, "BODY")
+        The data goes to a .tmp sibling first and is renamed into place, so
+        the Argus INBOX watcher never picks up a partially written order.
+        """
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+        fd = os.open(tmp_path, flags, 0o644)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            os.fsync(fd)
+        except Exception:
+            os.close(fd)
+            os.unlink(tmp_path)
+            raise
+        os.close(fd)
+        os.replace(tmp_path, path)
+    
+    def _archive_order(self, inbox_file: Path, filename: str) -> Path:
+        """
+        Keep a copy of an INBOX order in the data archive
         
-        # Measurement parameters
-        ET.SubElement(body, "FREQUENCY", unit="Hz").text = str(int(frequency))
-        ET.SubElement(body, "BANDWIDTH", unit="Hz").text = str(int(bandwidth))
-        ET.SubElement(body, "DETECTOR").text = detector
-        ET.SubElement(body, "MEAS_TIME", unit="ms").text = str(meas_time)
-        ET.SubElement(body, "ATTENUATION").text = str(attenuation)
-        ET.SubElement(body, "MEAS_TYPE").text = measurement_type
+        Hardlinks the INBOX file when both directories share a filesystem,
+        otherwise falls back to a plain file copy.
+        """
+        archive_file = self.data_path / "adc_orders" / filename
+        try:
+            os.link(inbox_file, archive_file)
+        except OSError:
+            shutil.copyfile(inbox_file, archive_file)
+        return archive_file
+    
+    def submit_scan_order(
+        self, order_id: str, created_at: Optional[datetime] = None, **params: Any
+    ) -> Dict[str, Any]:
+        """
+        Render a SCAN order and save it to the Argus INBOX
         
-        return self._format_xml(root)
+        Accepts the same parameters as create_scan_order and returns the
+        same result dictionary as save_order_to_inbox.
+        """
+        xml_content = self.create_scan_order(order_id, created_at=created_at, **params)
+        return self.save_order_to_inbox(xml_content, order_id, created_at)
     
-    def _format_xml(self, root: ET.Element) -> str:
-        """Format XML with proper indentation and declaration"""
-        rough_string = ET.tostring(root, encoding='unicode')
-        reparsed = minidom.parseString(rough_string)
-        return reparsed.toprettyxml(indent="  ")
+    def submit_single_freq_order(
+        self, order_id: str, created_at: Optional[datetime] = None, **params: Any
+    ) -> Dict[str, Any]:
+        """
+        Render a single frequency order and save it to the Argus INBOX
+        
+        Accepts the same parameters as create_single_freq_order and returns
+        the same result dictionary as save_order_to_inbox.
+        """
+        xml_content = self.create_single_freq_order(order_id, created_at=created_at, **params)
+        return self.save_order_to_inbox(xml_content, order_id, created_at)
     
-    def save_order_to_inbox(self, xml_content: str, order_id: str) -> Dict[str, Any]:
+    def save_order_to_inbox(
+        self, xml_content: str, order_id: str, created_at: Optional[datetime] = None
+    ) -> Dict[str, Any]:
         """
         Save ADC order XML to Argus INBOX directory
         
         Args:
             xml_content: XML content to save
             order_id: Order identifier
+            created_at: Time the order ID was generated (defaults to now)
             
         Returns:
             Dictionary with file path and status
         """
         try:
             # Create filename with timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"ADC_{order_id}_{timestamp}.xml"
+            created_at = datetime.now() if created_at is None else created_at.astimezone()
+            filename = f"ADC_{order_id}_{created_at:%Y%m%d_%H%M%S}.xml"
             
             # Save to INBOX (Argus will auto-detect and execute)
             inbox_file = self.inbox_path / filename
-            with open(inbox_file, 'w', encoding='utf-8') as f:
-                f.write(xml_content)
+            self._write_atomic(inbox_file, xml_content.encode('utf-8'))
             
-            # Also save copy to data archive
-            archive_file = self.data_path / "adc_orders" / filename
-            with open(archive_file, 'w', encoding='utf-8') as f:
-                f.write(xml_content)
+            # Also keep a copy in the data archive
+            archive_file = self._archive_order(inbox_file, filename)
             
             logger.info(f"ADC order saved to INBOX: {filename}")
             
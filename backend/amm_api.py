@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Optional
-from datetime import datetime
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import IndexModel
 from auth import get_current_user, require_admin
 from models import User
 from amm_models import (
@@ -10,91 +12,163 @@ from amm_models import (
     AMMExecution, AMMExecutionSummary, AMMDashboardStats, AMMStatus
 )
 from amm_scheduler import AMMScheduler
+import asyncio
+import orjson
+import os
+import time
 import uuid
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Dashboard stats are served from memory for this many seconds
+STATS_CACHE_TTL = float(os.environ.get("AMM_STATS_CACHE_TTL", "60"))
+
+# Configuration lookups for execute-now are shared for a few seconds
+CONFIG_CACHE_TTL = 5
+CONFIG_CACHE_MAX_ENTRIES = 256
+
+# Definitions of an AMM configuration: legacy collection, reference field, embedded field.
+# Definitions are embedded in the configuration document; the separate collections
+# are only read for configurations created before embedding.
+DEFINITION_COLLECTIONS = (
+    ("timing_definitions", "timing_definition_id", "timing_definition"),
+    ("measurement_definitions", "measurement_definition_id", "measurement_definition"),
+    ("range_definitions", "range_definition_id", "range_definition"),
+    ("general_definitions", "general_definition_id", "general_definition"),
+)
+EMBEDDED_DEFINITIONS = {embedded for _, _, embedded in DEFINITION_COLLECTIONS}
+
+# Reads only fetch the fields the response models define; lists leave out embedded definitions
+CONFIGURATION_PROJECTION = {"_id": 0, **{field: 1 for field in AMMConfiguration.model_fields}}
+CONFIGURATION_LIST_PROJECTION = {
+    field: 1 for field in CONFIGURATION_PROJECTION if field not in EMBEDDED_DEFINITIONS
+}
+CONFIGURATION_LIST_PROJECTION["_id"] = 0
+EXECUTION_PROJECTION = {"_id": 0, **{field: 1 for field in AMMExecution.model_fields}}
+
+def _facet_counts(result: List[dict]) -> dict:
+    """Flatten a $facet/$count aggregation result into {branch: count}"""
+    if not result:
+        return {}
+    return {branch: (docs[0]["n"] if docs else 0) for branch, docs in result[0].items()}
+
+def _construct_configuration(doc: dict) -> AMMConfiguration:
+    """
+    Build an AMMConfiguration from a stored document without re-validating it
+    
+    Documents were validated when written; only the status string is mapped
+    back to AMMStatus so serialization sees the declared type.
+    """
+    if "status" in doc:
+        doc["status"] = AMMStatus(doc["status"])
+    return AMMConfiguration.model_construct(**doc)
+
 class AMMService:
     def __init__(self, db: AsyncIOMotorDatabase, scheduler: AMMScheduler):
         self.db = db
         self.scheduler = scheduler
+        self._stats_cache: Optional[Tuple[float, AMMDashboardStats]] = None
+        self._stats_lock = asyncio.Lock()
+        self._config_cache: Dict[str, Tuple[float, "asyncio.Future[Optional[AMMConfiguration]]"]] = {}
+    
+    def _cached_stats(self) -> Optional[AMMDashboardStats]:
+        """Return a copy of the cached dashboard stats if still fresh"""
+        if self._stats_cache is not None:
+            cached_at, stats = self._stats_cache
+            if time.monotonic() - cached_at < STATS_CACHE_TTL:
+                return stats.model_copy()
+        return None
         
     async def get_dashboard_stats(self) -> AMMDashboardStats:
-        """Get dashboard statistics for AMM overview"""
-        try:
-            # Get basic counts
-            total_amm_configs = await self.db.amm_configurations.count_documents({})
-            active_amm_configs = await self.db.amm_configurations.count_documents({"status": AMMStatus.ACTIVE})
-            
-            # Get running executions
-            running_executions = await self.db.amm_executions.count_documents({"status": "running"})
-            
-            # Get executions in last 24 hours
-            yesterday = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-            executions_last_24h = await self.db.amm_executions.count_documents({
-                "started_at": {"$gte": yesterday}
-            })
-            
-            # Calculate success rate
-            total_executions_24h = executions_last_24h
-            failed_executions_24h = await self.db.amm_executions.count_documents({
-                "started_at": {"$gte": yesterday},
-                "status": "failed"
-            })
-            
-            success_rate_24h = 100.0
-            if total_executions_24h > 0:
-                success_rate_24h = ((total_executions_24h - failed_executions_24h) / total_executions_24h) * 100
-            
-            # Count alarms (placeholder - would need alarm tracking)
-            alarms_last_24h = 0
+        """Get dashboard statistics for AMM overview (cached for STATS_CACHE_TTL seconds)"""
+        stats = self._cached_stats()
+        if stats is not None:
+            return stats
+        
+        async with self._stats_lock:
+            # Another request may have refreshed the cache while we waited
+            stats = self._cached_stats()
+            if stats is not None:
+                return stats
             
-            return AMMDashboardStats(
-                total_amm_configs=total_amm_configs,
-                active_amm_configs=active_amm_configs,
-                running_executions=running_executions,
-                executions_last_24h=executions_last_24h,
-                alarms_last_24h=alarms_last_24h,
-                success_rate_24h=round(success_rate_24h, 1)
-            )
+            try:
+                stats = await self._compute_dashboard_stats()
+            except Exception as e:
+                logger.error(f"Error getting dashboard stats: {e}")
+                # Return default stats on error (not cached, so the next request retries)
+                return AMMDashboardStats(
+                    total_amm_configs=0,
+                    active_amm_configs=0,
+                    running_executions=0,
+                    executions_last_24h=0,
+                    alarms_last_24h=0,
+                    success_rate_24h=0.0
+                )
             
-        except Exception as e:
-            logger.error(f"Error getting dashboard stats: {e}")
-            # Return default stats on error
-            return AMMDashboardStats(
-                total_amm_configs=0,
-                active_amm_configs=0,
-                running_executions=0,
-                executions_last_24h=0,
-                alarms_last_24h=0,
-                success_rate_24h=0.0
-            )
+            self._stats_cache = (time.monotonic(), stats)
+            return stats.model_copy()
+    
+    async def _compute_dashboard_stats(self) -> AMMDashboardStats:
+        """Query dashboard statistics from the database"""
+        # Executions in last 24 hours
+        yesterday = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        started_filter = {"started_at": {"$gte": yesterday}}
+        
+        # One $facet per collection instead of five count_documents round trips
+        config_pipeline = [{"$facet": {
+            "total": [{"$count": "n"}],
+            "active": [{"$match": {"status": AMMStatus.ACTIVE}}, {"$count": "n"}]
+        }}]
+        execution_pipeline = [{"$facet": {
+            "running": [{"$match": {"status": "running"}}, {"$count": "n"}],
+            "last24h": [{"$match": started_filter}, {"$count": "n"}],
+            "failed24h": [{"$match": {"status": "failed", **started_filter}}, {"$count": "n"}]
+        }}]
+        config_counts, execution_counts = await asyncio.gather(
+            self.db.amm_configurations.aggregate(config_pipeline).to_list(1),
+            self.db.amm_executions.aggregate(execution_pipeline).to_list(1)
+        )
+        config_counts = _facet_counts(config_counts)
+        execution_counts = _facet_counts(execution_counts)
+        
+        total_amm_configs = config_counts.get("total", 0)
+        active_amm_configs = config_counts.get("active", 0)
+        running_executions = execution_counts.get("running", 0)
+        executions_last_24h = execution_counts.get("last24h", 0)
+        
+        # Calculate success rate
+        total_executions_24h = executions_last_24h
+        failed_executions_24h = execution_counts.get("failed24h", 0)
+        
+        success_rate_24h = 100.0
+        if total_executions_24h > 0:
+            success_rate_24h = ((total_executions_24h - failed_executions_24h) / total_executions_24h) * 100
+        
+        # Count alarms (placeholder - would need alarm tracking)
+        alarms_last_24h = 0
+        
+        return AMMDashboardStats(
+            total_amm_configs=total_amm_configs,
+            active_amm_configs=active_amm_configs,
+            running_executions=running_executions,
+            executions_last_24h=executions_last_24h,
+            alarms_last_24h=alarms_last_24h,
+            success_rate_24h=round(success_rate_24h, 1)
+        )
+        
     
     async def create_amm_configuration(self, config_data: AMMConfigurationCreate, created_by: str) -> AMMConfiguration:
         """Create a new AMM configuration"""
         
-        # Create timing definition
         timing_def = config_data.timing_definition
-        timing_def.created_by = created_by
-        await self.db.timing_definitions.insert_one(timing_def.dict())
-        
-        # Create measurement definition
         measurement_def = config_data.measurement_definition
-        measurement_def.created_by = created_by
-        await self.db.measurement_definitions.insert_one(measurement_def.dict())
-        
-        # Create range definition
         range_def = config_data.range_definition
-        range_def.created_by = created_by
-        await self.db.range_definitions.insert_one(range_def.dict())
-        
-        # Create general definition
         general_def = config_data.general_definition
-        general_def.created_by = created_by
-        await self.db.general_definitions.insert_one(general_def.dict())
+        for definition in (timing_def, measurement_def, range_def, general_def):
+            definition.created_by = created_by
         
-        # Create AMM configuration
+        # Create AMM configuration with its definitions embedded
         amm_config = AMMConfiguration(
             name=config_data.name,
             description=config_data.description,
@@ -102,28 +176,89 @@ class AMMService:
             measurement_definition_id=measurement_def.id,
             range_definition_id=range_def.id,
             general_definition_id=general_def.id,
+            timing_definition=timing_def,
+            measurement_definition=measurement_def,
+            range_definition=range_def,
+            general_definition=general_def,
             created_by=created_by
         )
         
-        await self.db.amm_configurations.insert_one(amm_config.dict())
+        await self.db.amm_configurations.insert_one(amm_config.model_dump())
         
         return amm_config
     
     async def get_amm_configurations(self, limit: int = 50) -> List[AMMConfiguration]:
         """Get AMM configurations"""
-        configs = await self.db.amm_configurations.find().sort("created_at", -1).limit(limit).to_list(limit)
-        return [AMMConfiguration(**config) for config in configs]
+        configs = await self.db.amm_configurations.find({}, CONFIGURATION_LIST_PROJECTION).sort("created_at", -1).limit(limit).to_list(limit)
+        return [_construct_configuration(config) for config in configs]
+    
+    async def stream_amm_configurations(self, limit: int = 50) -> AsyncIterator[bytes]:
+        """Yield AMM configurations as NDJSON lines, one cursor batch in memory at a time"""
+        cursor = self.db.amm_configurations.find({}, CONFIGURATION_LIST_PROJECTION).sort(
+            "created_at", -1
+        ).limit(limit).batch_size(50)
+        async for config in cursor:
+            yield orjson.dumps(config) + b"\n"
     
     async def get_amm_configuration(self, config_id: str) -> Optional[AMMConfiguration]:
         """Get specific AMM configuration"""
-        config_data = await self.db.amm_configurations.find_one({"id": config_id})
+        config_data = await self.db.amm_configurations.find_one({"id": config_id}, CONFIGURATION_PROJECTION)
         if config_data:
+            # Validated here since the embedded definitions contain nested models
             return AMMConfiguration(**config_data)
         return None
     
+    async def get_definition(self, embedded: str, definition_id: str) -> Optional[dict]:
+        """Get an embedded definition by ID, falling back to the legacy definition collection"""
+        config_data = await self.db.amm_configurations.find_one(
+            {f"{embedded}.id": definition_id},
+            {"_id": 0, embedded: 1}
+        )
+        if config_data:
+            return config_data[embedded]
+        return await self.db[f"{embedded}s"].find_one({"id": definition_id}, {"_id": 0})
+    
+    async def get_cached_configuration(self, config_id: str) -> Optional[AMMConfiguration]:
+        """
+        Get an AMM configuration through a short TTL cache
+        
+        Concurrent callers for the same ID share a single in-flight lookup.
+        Failed lookups are not cached.
+        """
+        entry = self._config_cache.get(config_id)
+        if entry is None or time.monotonic() - entry[0] >= CONFIG_CACHE_TTL:
+            if config_id not in self._config_cache and len(self._config_cache) >= CONFIG_CACHE_MAX_ENTRIES:
+                # Drop the oldest entry
+                self._config_cache.pop(next(iter(self._config_cache)))
+            entry = (time.monotonic(), asyncio.ensure_future(self.get_amm_configuration(config_id)))
+            self._config_cache[config_id] = entry
+        
+        try:
+            return await asyncio.shield(entry[1])
+        except Exception:
+            if self._config_cache.get(config_id) is entry:
+                del self._config_cache[config_id]
+            raise
+    
+    def _invalidate_configuration(self, config_id: str):
+        """Drop a configuration from the lookup cache after it changes"""
+        self._config_cache.pop(config_id, None)
+    
     async def update_amm_configuration(self, config_id: str, update_data: AMMConfigurationUpdate) -> bool:
         """Update AMM configuration"""
-        update_dict = {k: v for k, v in update_data.dict().items() if v is not None}
+        # Only fields the client sent; explicit nulls are still ignored as before
+        update_dict = update_data.model_dump(
+            exclude_unset=True, exclude_none=True, exclude=EMBEDDED_DEFINITIONS
+        )
+        # Replaced definitions are stored whole and their references kept in sync
+        for _, id_field, embedded in DEFINITION_COLLECTIONS:
+            definition = getattr(update_data, embedded)
+            if definition is not None:
+                update_dict[embedded] = definition.model_dump()
+                update_dict[id_field] = definition.id
+        if update_data.timing_definition is not None:
+            # Let the scheduler recompute when the AMM is next due
+            update_dict["next_execution"] = None
         if not update_dict:
             return True
             
@@ -133,44 +268,67 @@ class AMMService:
             {"id": config_id},
             {"$set": update_dict}
         )
+        self._invalidate_configuration(config_id)
+        self.scheduler.notify()
         
         return result.modified_count > 0
     
     async def delete_amm_configuration(self, config_id: str) -> bool:
         """Delete AMM configuration and related definitions"""
-        # Get the configuration first
-        config = await self.get_amm_configuration(config_id)
-        if not config:
+        # Remove the configuration atomically and get back its definition references
+        projection = {"_id": 0}
+        for _, id_field, embedded in DEFINITION_COLLECTIONS:
+            projection[id_field] = 1
+            projection[f"{embedded}.id"] = 1
+        config_data = await self.db.amm_configurations.find_one_and_delete(
+            {"id": config_id},
+            projection=projection
+        )
+        if not config_data:
             return False
+        self._invalidate_configuration(config_id)
         
-        # Delete related definitions
-        await self.db.timing_definitions.delete_one({"id": config.timing_definition_id})
-        await self.db.measurement_definitions.delete_one({"id": config.measurement_definition_id})
-        await self.db.range_definitions.delete_one({"id": config.range_definition_id})
-        await self.db.general_definitions.delete_one({"id": config.general_definition_id})
-        
-        # Delete the configuration
-        result = await self.db.amm_configurations.delete_one({"id": config_id})
+        # Embedded definitions went with the document; only legacy ones live elsewhere
+        await asyncio.gather(*(
+            self.db[collection].delete_one({"id": config_data[id_field]})
+            for collection, id_field, embedded in DEFINITION_COLLECTIONS
+            if config_data.get(id_field) and embedded not in config_data
+        ))
         
-        return result.deleted_count > 0
+        return True
     
-    async def start_amm_configuration(self, config_id: str) -> bool:
-        """Start (activate) an AMM configuration"""
+    async def _set_status(self, config_id: str, status: AMMStatus, reset_schedule: bool = False) -> bool:
+        """
+        Set a configuration's status, returning whether the configuration exists
+        
+        Repeating the current status is not an error. The pipeline update only
+        touches modified_at when the status actually changes. reset_schedule
+        clears next_execution so the scheduler checks the AMM on its next tick.
+        """
+        fields = {
+            "modified_at": {"$cond": [{"$eq": ["$status", status]}, "$modified_at", datetime.utcnow()]},
+            "status": status
+        }
+        if reset_schedule:
+            fields["next_execution"] = None
+        
         result = await self.db.amm_configurations.update_one(
             {"id": config_id},
-            {"$set": {"status": AMMStatus.ACTIVE, "modified_at": datetime.utcnow()}}
+            [{"$set": fields}]
         )
+        self._invalidate_configuration(config_id)
         
-        return result.modified_count > 0
+        return result.matched_count > 0
+    
+    async def start_amm_configuration(self, config_id: str) -> bool:
+        """Start (activate) an AMM configuration"""
+        started = await self._set_status(config_id, AMMStatus.ACTIVE, reset_schedule=True)
+        self.scheduler.notify()
+        return started
     
     async def stop_amm_configuration(self, config_id: str) -> bool:
         """Stop (deactivate) an AMM configuration"""
-        result = await self.db.amm_configurations.update_one(
-            {"id": config_id},
-            {"$set": {"status": AMMStatus.STOPPED, "modified_at": datetime.utcnow()}}
-        )
-        
-        return result.modified_count > 0
+        return await self._set_status(config_id, AMMStatus.STOPPED)
     
     async def get_amm_executions(self, amm_config_id: Optional[str] = None, limit: int = 50) -> List[AMMExecution]:
         """Get AMM execution history"""
@@ -178,11 +336,39 @@ class AMMService:
         if amm_config_id:
             query["amm_config_id"] = amm_config_id
             
-        executions = await self.db.amm_executions.find(query).sort("started_at", -1).limit(limit).to_list(limit)
-        return [AMMExecution(**execution) for execution in executions]
+        executions = await self.db.amm_executions.find(query, EXECUTION_PROJECTION).sort("started_at", -1).limit(limit).to_list(limit)
+        return [AMMExecution.model_construct(**execution) for execution in executions]
+
+async def ensure_indexes(db: AsyncIOMotorDatabase):
+    """
+    Create indexes backing the AMM dashboard and list queries
+    
+    Dashboard counts filter on status and started_at, the scheduler selects
+    active configurations by next_execution, execution history is
+    sorted by started_at per configuration, configurations are listed
+    newest-first and embedded definitions are looked up by their id.
+    create_indexes is idempotent.
+    """
+    try:
+        await asyncio.gather(
+            db.amm_executions.create_indexes([
+                IndexModel([("status", 1), ("started_at", -1)]),
+                IndexModel([("amm_config_id", 1), ("started_at", -1)]),
+                IndexModel([("started_at", -1)])
+            ]),
+            db.amm_configurations.create_indexes([
+                IndexModel([("status", 1), ("next_execution", 1)]),
+                IndexModel([("created_at", -1)]),
+                IndexModel([("measurement_definition.id", 1)], sparse=True),
+                IndexModel([("range_definition.id", 1)], sparse=True)
+            ])
+        )
+        logger.info("AMM indexes ensured")
+    except Exception as e:
+        logger.warning(f"Could not create AMM indexes: {str(e)}")
 
 def create_amm_router(db: AsyncIOMotorDatabase, scheduler: AMMScheduler) -> APIRouter:
-    router = APIRouter(tags=["Automatic Mode"])
+    router = APIRouter(tags=["Automatic Mode"], default_response_class=ORJSONResponse)
     service = AMMService(db, scheduler)
     
     @router.get("/api/amm/dashboard-stats", response_model=AMMDashboardStats)
@@ -198,22 +384,31 @@ def create_amm_router(db: AsyncIOMotorDatabase, scheduler: AMMScheduler) -> APIR
         """Get AMM configurations"""
         return await service.get_amm_configurations(limit)
     
+    @router.get("/api/amm/configurations/stream")
+    async def stream_amm_configurations(
+        limit: int = Query(50, ge=1, le=200),
+        current_user: User = Depends(get_current_user)
+    ):
+        """Stream AMM configurations as newline-delimited JSON"""
+        return StreamingResponse(
+            service.stream_amm_configurations(limit),
+            media_type="application/x-ndjson"
+        )
+    
     @router.post("/api/amm/configurations", response_model=AMMConfiguration)
     async def create_amm_configuration(
         config_data: AMMConfigurationCreate,
+        background_tasks: BackgroundTasks,
         current_user: User = Depends(get_current_user)
     ):
         """Create new AMM configuration and immediately generate XML order"""
         # Create the configuration
         config = await service.create_amm_configuration(config_data, current_user.id)
         
-        # Immediately generate and send XML order to inbox
-        try:
-            await scheduler._execute_amm(config)
-            logger.info(f"AMM XML generated immediately for config: {config.id}")
-        except Exception as e:
-            logger.error(f"Error generating immediate AMM XML: {e}")
-            # Don't fail the creation, just log the error
+        # Generate and send the XML order to the inbox after responding;
+        # _execute_amm logs its own errors, so a failure doesn't fail the creation
+        background_tasks.add_task(scheduler._execute_amm, config)
+        logger.info(f"AMM XML generation queued for config: {config.id}")
         
         return config
     
@@ -297,14 +492,21 @@ def create_amm_router(db: AsyncIOMotorDatabase, scheduler: AMMScheduler) -> APIR
     @router.post("/api/amm/configurations/{config_id}/execute-now")
     async def execute_amm_now(
         config_id: str,
+        background_tasks: BackgroundTasks,
+        run_async: bool = Query(False, alias="async", description="Return before the execution finishes"),
         current_user: User = Depends(get_current_user)
     ):
         """Manually trigger immediate execution of an AMM configuration (for testing)"""
-        config_data = await db.amm_configurations.find_one({"id": config_id})
-        if not config_data:
+        config = await service.get_cached_configuration(config_id)
+        if not config:
             raise HTTPException(status_code=404, detail="AMM configuration not found")
         
-        config = AMMConfiguration(**config_data)
+        if run_async:
+            background_tasks.add_task(scheduler._execute_amm, config)
+            return {
+                "success": True,
+                "message": f"AMM '{config.name}' execution queued. Check inbox folder for generated XML."
+            }
         
         try:
             # Execute immediately regardless of schedule
@@ -329,14 +531,10 @@ def create_amm_router(db: AsyncIOMotorDatabase, scheduler: AMMScheduler) -> APIR
     ):
         """Get a specific measurement definition by ID"""
         # Query by 'id' field, not '_id'
-        definition = await db.measurement_definitions.find_one({"id": definition_id})
+        definition = await service.get_definition("measurement_definition", definition_id)
         if not definition:
             raise HTTPException(status_code=404, detail=f"Measurement definition not found: {definition_id}")
         
-        # Remove MongoDB _id
-        if '_id' in definition:
-            del definition['_id']
-        
         return definition
 
     @router.get("/api/amm/range-definitions/{definition_id}")
@@ -347,14 +545,10 @@ def create_amm_router(db: AsyncIOMotorDatabase, scheduler: AMMScheduler) -> APIR
     ):
         """Get a specific range definition by ID"""
         # Query by 'id' field, not '_id'
-        definition = await db.range_definitions.find_one({"id": definition_id})
+        definition = await service.get_definition("range_definition", definition_id)
         if not definition:
             raise HTTPException(status_code=404, detail=f"Range definition not found: {definition_id}")
         
-        # Remove MongoDB _id
-        if '_id' in definition:
-            del definition['_id']
-        
         return definition
 
     @router.get("/api/amm/calendar-events")
@@ -372,11 +566,11 @@ def create_amm_router(db: AsyncIOMotorDatabase, scheduler: AMMScheduler) -> APIR
             events = []
             
             # Get all active AMM configurations
-            amm_configs = await db.amm_configurations.find({}).to_list(None)
+            amm_configs = await db.amm_configurations.find({}, {"_id": 0}).to_list(None)
             
             for config in amm_configs:
-                # Get timing definition
-                timing = await db.timing_definitions.find_one({"id": config.get("timing_definition_id")})
+                # Get timing definition (embedded, or from the legacy collection)
+                timing = config.get("timing_definition") or await db.timing_definitions.find_one({"id": config.get("timing_definition_id")}, {"_id": 0})
                 
                 if not timing:
                     continue
@@ -1,9 +1,13 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict, Any, Union
 from datetime import datetime, time
 from enum import Enum
 import uuid
 
+# Models persisted in MongoDB and rebuilt on every read: ignore stray stored
+# fields and never re-validate on attribute assignment
+STORED_MODEL_CONFIG = ConfigDict(extra="ignore", validate_assignment=False)
+
 class ScheduleType(str, Enum):
     ALWAYS = "always"
     SPAN = "span"
@@ -57,6 +61,8 @@ class AMMStatus(str, Enum):
 
 # Timing Definition
 class TimingDefinition(BaseModel):
+    model_config = STORED_MODEL_CONFIG
+    
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
     schedule_type: ScheduleType
@@ -129,6 +135,8 @@ class ReceiverConfiguration(BaseModel):
 
 # Measurement Definition
 class MeasurementDefinition(BaseModel):
+    model_config = STORED_MODEL_CONFIG
+    
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
     measurement_type: MeasurementType
@@ -172,6 +180,8 @@ class MeasurementDefinition(BaseModel):
 
 # Range Definition
 class RangeDefinition(BaseModel):
+    model_config = STORED_MODEL_CONFIG
+    
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
     
@@ -213,6 +223,8 @@ class ResultConfiguration(BaseModel):
 
 # General Definition
 class GeneralDefinition(BaseModel):
+    model_config = STORED_MODEL_CONFIG
+    
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
     
@@ -232,6 +244,8 @@ class GeneralDefinition(BaseModel):
 
 # AMM Configuration (Main)
 class AMMConfiguration(BaseModel):
+    model_config = STORED_MODEL_CONFIG
+    
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
     description: Optional[str] = None
@@ -243,6 +257,12 @@ class AMMConfiguration(BaseModel):
     range_definition_id: str
     general_definition_id: str
     
+    # Embedded Definitions (None on configurations created before embedding)
+    timing_definition: Optional[TimingDefinition] = None
+    measurement_definition: Optional[MeasurementDefinition] = None
+    range_definition: Optional[RangeDefinition] = None
+    general_definition: Optional[GeneralDefinition] = None
+    
     # Execution Info
     last_execution: Optional[datetime] = None
     next_execution: Optional[datetime] = None
@@ -258,6 +278,8 @@ class AMMConfiguration(BaseModel):
 
 # AMM Execution Instance
 class AMMExecution(BaseModel):
+    model_config = STORED_MODEL_CONFIG
+    
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     amm_config_id: str
     
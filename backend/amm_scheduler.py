@@ -1,23 +1,219 @@
 import asyncio
+import functools
 import logging
-from datetime import datetime, timedelta, time
-from typing import List, Optional
+from collections import namedtuple
+from types import MappingProxyType, SimpleNamespace
+from datetime import datetime, timedelta, time, date
+from typing import List, Optional, Union
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
 from amm_models import (
     AMMConfiguration, AMMExecution, TimingDefinition, MeasurementDefinition,
     ScheduleType, AMMStatus
 )
 from xml_processor import ArgusXMLProcessor
-from croniter import croniter
 
 logger = logging.getLogger(__name__)
 
+# An AMM never runs twice within this many seconds
+MIN_EXECUTION_GAP_SECONDS = 60
+
+# Configuration fields the scheduler tick reads before deciding to run an AMM
+TICK_PROJECTION = {
+    "_id": 0, "id": 1, "last_execution": 1, "next_execution": 1,
+    "timing_definition": 1, "timing_definition_id": 1
+}
+
+# AMM executions allowed to run at the same time
+MAX_CONCURRENT_EXECUTIONS = 16
+
+# Bounds on the scheduler loop's sleep between ticks
+MIN_SLEEP_SECONDS = 1
+MAX_SLEEP_SECONDS = 60
+
+# XML order parameters an AMM execution starts from; _convert_amm_to_xml_params
+# overrides them from the measurement definition
+ORDER_PARAM_DEFAULTS = MappingProxyType({
+    "result_type": "MR",  # Measurement Result (ORM 4.1)
+    "priority": "LOW",
+    "creator": "Extern",
+    "signal_path": "ADD197+075-EB500 DF",
+    "station_name": "UMS300-100801",
+    "station_type": "F",  # Fixed station
+    # Receiver and MDT parameters
+    "rf_attenuation": "Auto",
+    "demod": "Off",
+    "meas_time": -1,
+    "detect_type": "Peak",
+    "if_attenuation": "Normal",
+    "preamplification": "Off",
+    "mode": "Normal",
+    "if_span": 250000,
+    "squelch": "Off",
+    "hold_time": 0,
+    "meas_data_type": "LV",  # Level
+    # Antenna
+    "ant_port": "P1",
+    "ant_mode": "FIX",
+    "time_mode": "P",  # Periodic
+    # Location (defaults for Colombia)
+    "longitude": -77.264667,
+    "latitude": 1.201194,
+    "height": 600,
+    "operator_name": "ArgusUI"
+})
+
+# Timing definition fields that affect scheduling
+TIMING_FIELDS = (
+    "schedule_type", "start_date", "end_date", "start_time", "end_time", "weekdays",
+    "interval_minutes", "interval_hours", "interval_days"
+)
+
+# Timing definition pre-parsed for the per-tick checks
+CompiledTiming = namedtuple("CompiledTiming", [
+    "schedule_type", "start_date", "end_date", "start_day", "end_day",
+    "start_time", "end_time", "start_seconds", "end_seconds", "weekday_mask", "interval_seconds"
+])
+
+def _without_running_executions() -> List[dict]:
+    """Aggregation stages dropping AMM configurations that have a running execution"""
+    return [
+        {"$lookup": {
+            "from": "amm_executions",
+            "let": {"cid": "$id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$amm_config_id", "$$cid"]},
+                    {"$eq": ["$status", "running"]}
+                ]}}},
+                {"$limit": 1},
+                {"$project": {"_id": 1}}
+            ],
+            "as": "running"
+        }},
+        {"$match": {"running": {"$size": 0}}},
+        {"$project": {"running": 0}}
+    ]
+
+def _parse_time(value: Union[str, time, None]) -> Optional[time]:
+    """Parse an HH:MM[:SS] string as stored on timing definitions"""
+    if not value or isinstance(value, time):
+        return value or None
+    return time.fromisoformat(value)
+
+def _to_day(value: Union[datetime, date, None]) -> Optional[date]:
+    return value.date() if isinstance(value, datetime) else value
+
+def _seconds_of_day(value: Union[datetime, time]) -> float:
+    """Seconds since midnight, so window checks compare numbers instead of time objects"""
+    return value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1e6
+
+@functools.lru_cache(maxsize=1024)
+def _compile_timing(fields: tuple) -> CompiledTiming:
+    """Parse timing fields once; keyed by content, so edited definitions get a new entry"""
+    (schedule_type, start_date, end_date, start_time, end_time, weekdays,
+     interval_minutes, interval_hours, interval_days) = fields
+    
+    interval_seconds = 0
+    if interval_minutes:
+        interval_seconds += interval_minutes * 60
+    if interval_hours:
+        interval_seconds += interval_hours * 3600
+    if interval_days:
+        interval_seconds += interval_days * 86400
+    
+    start_time = _parse_time(start_time)
+    end_time = _parse_time(end_time)
+    
+    return CompiledTiming(
+        schedule_type=ScheduleType(schedule_type),
+        start_date=start_date,
+        end_date=end_date,
+        start_day=_to_day(start_date),
+        end_day=_to_day(end_date),
+        start_time=start_time,
+        end_time=end_time,
+        start_seconds=_seconds_of_day(start_time) if start_time else None,
+        end_seconds=_seconds_of_day(end_time) if end_time else None,
+        # Bit n set when weekday n (0=Monday) is allowed
+        weekday_mask=functools.reduce(lambda mask, day: mask | 1 << day, weekdays, 0),
+        interval_seconds=interval_seconds
+    )
+
+def compile_timing(timing: Union[TimingDefinition, dict]) -> CompiledTiming:
+    """Get the cached compiled form of a timing definition (model or stored document)"""
+    get = timing.get if isinstance(timing, dict) else functools.partial(getattr, timing)
+    fields = tuple(get(field, None) for field in TIMING_FIELDS)
+    # Lists are not hashable; weekdays is the only one
+    fields = fields[:5] + (tuple(fields[5] or ()),) + fields[6:]
+    return _compile_timing(fields)
+
+def _next_in_window(earliest: datetime, start: time, end: time, day_ok) -> Optional[datetime]:
+    """First moment >= earliest inside a daily [start, end] window on an allowed day"""
+    for offset in range(8):
+        day = earliest.date() + timedelta(days=offset)
+        if not day_ok(day):
+            continue
+        if offset == 0:
+            if earliest.time() <= end:
+                return max(earliest, datetime.combine(day, start))
+        else:
+            return datetime.combine(day, start)
+    return None
+
+def next_execution_time(timing: CompiledTiming, last_execution: Optional[datetime],
+                        now: datetime) -> Optional[datetime]:
+    """
+    Earliest time an AMM can next be due
+    
+    Never later than the next time _check_timing_conditions would pass, so
+    the scheduler can skip the AMM until then. None means no bound is known
+    and the AMM is checked on every tick.
+    """
+    earliest = now
+    if last_execution:
+        earliest = max(now, last_execution + timedelta(seconds=MIN_EXECUTION_GAP_SECONDS))
+    
+    if timing.schedule_type == ScheduleType.ALWAYS:
+        return earliest
+    
+    elif timing.schedule_type == ScheduleType.SPAN:
+        if not (timing.start_day and timing.end_day):
+            return None
+        if earliest.date() < timing.start_day:
+            earliest = datetime.combine(timing.start_day, time.min)
+        in_span = lambda day: timing.start_day <= day <= timing.end_day
+        if timing.start_time and timing.end_time:
+            return _next_in_window(earliest, timing.start_time, timing.end_time, in_span)
+        return earliest if in_span(earliest.date()) else None
+    
+    elif timing.schedule_type == ScheduleType.DAILY:
+        if timing.start_time and timing.end_time:
+            return _next_in_window(earliest, timing.start_time, timing.end_time, lambda day: True)
+    
+    elif timing.schedule_type == ScheduleType.WEEKDAYS:
+        if timing.weekday_mask and timing.start_time and timing.end_time:
+            return _next_in_window(earliest, timing.start_time, timing.end_time,
+                                   lambda day: timing.weekday_mask >> day.weekday() & 1)
+    
+    elif timing.schedule_type == ScheduleType.INTERVAL:
+        if not last_execution:
+            return earliest  # First execution
+        if timing.interval_seconds > 0:
+            return max(earliest, last_execution + timedelta(seconds=timing.interval_seconds))
+    
+    return None
+
 class AMMScheduler:
     def __init__(self, db: AsyncIOMotorDatabase, xml_processor: ArgusXMLProcessor):
         self.db = db
         self.xml_processor = xml_processor
         self.running = False
         self.scheduler_task = None
+        # Set by notify() to run a tick immediately after configuration changes
+        self._wake_event = asyncio.Event()
+        # Limits how many AMM executions run at once
+        self._exec_sem = asyncio.Semaphore(MAX_CONCURRENT_EXECUTIONS)
         
     async def start_scheduler(self):
         """Start the AMM scheduler"""
@@ -40,14 +236,19 @@ class AMMScheduler:
         logger.info("AMM Scheduler stopped")
         
     async def _scheduler_loop(self):
-        """Main scheduler loop - runs every minute"""
+        """Main scheduler loop - runs at least every minute, sooner when an AMM is due"""
         while self.running:
             try:
                 current_time = datetime.utcnow()
                 await self._check_scheduled_amms(current_time)
                 
-                # Sleep for 60 seconds
-                await asyncio.sleep(60)
+                # Sleep until the next AMM is due (at most 60 seconds) or notify() is called
+                try:
+                    await asyncio.wait_for(self._wake_event.wait(), timeout=await self._seconds_until_next_due())
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    self._wake_event.clear()
                 
             except asyncio.CancelledError:
                 break
@@ -55,119 +256,219 @@ class AMMScheduler:
                 logger.error(f"Error in scheduler loop: {e}")
                 await asyncio.sleep(60)  # Continue after error
                 
+    def notify(self):
+        """Wake the scheduler loop so configuration changes are picked up right away"""
+        self._wake_event.set()
+        
+    async def _seconds_until_next_due(self) -> float:
+        """
+        Seconds until the earliest stored next_execution of an active AMM, capped at the tick
+        
+        AMMs with a running execution are left out, as _due_pipeline skips them.
+        """
+        soonest = await self.db.amm_configurations.aggregate([
+            {"$match": {"status": AMMStatus.ACTIVE, "next_execution": {"$ne": None}}},
+            {"$sort": {"next_execution": 1}},
+            {"$project": {"_id": 0, "id": 1, "next_execution": 1}},
+            *_without_running_executions(),
+            {"$limit": 1}
+        ]).to_list(length=1)
+        if not soonest:
+            return MAX_SLEEP_SECONDS
+        soonest = soonest[0]
+        
+        # Small margin so we never wake just before the AMM becomes due
+        seconds = (soonest["next_execution"] - datetime.utcnow()).total_seconds() + 0.1
+        return min(MAX_SLEEP_SECONDS, max(MIN_SLEEP_SECONDS, seconds))
+        
+    def _due_pipeline(self, current_time: datetime) -> List[dict]:
+        """
+        Aggregation selecting active AMMs that may be due, in one round trip
+        
+        Skips configurations whose stored next_execution is still in the
+        future (a missing value means "check now"), joins the legacy timing
+        definition for configurations without an embedded one, and drops
+        configurations that already have a running execution.
+        """
+        return [
+            {"$match": {
+                "status": AMMStatus.ACTIVE,
+                "$or": [
+                    {"next_execution": {"$lte": current_time}},
+                    {"next_execution": None}
+                ]
+            }},
+            # Only what the timing check needs; full documents are loaded for AMMs that run
+            {"$project": TICK_PROJECTION},
+            {"$lookup": {
+                "from": "timing_definitions",
+                "localField": "timing_definition_id",
+                "foreignField": "id",
+                "as": "legacy_timing"
+            }},
+            *_without_running_executions()
+        ]
+        
     async def _check_scheduled_amms(self, current_time: datetime):
         """Check for AMMs that should be executed now"""
         try:
-            # Get all active AMM configurations
-            active_amms = await self.db.amm_configurations.find({
-                "status": AMMStatus.ACTIVE
-            }).to_list(length=None)
-            
-            for amm_config_data in active_amms:
-                amm_config = AMMConfiguration(**amm_config_data)
-                
-                # Get timing definition
-                timing_def_data = await self.db.timing_definitions.find_one({
-                    "id": amm_config.timing_definition_id
-                })
+            # Active AMMs that may be due and are not already running
+            due_amms = await self.db.amm_configurations.aggregate(
+                self._due_pipeline(current_time)
+            ).to_list(length=None)
+            
+            # Bounds for AMMs that are checked but not run, written in one batch
+            next_updates = []
+            # IDs of AMMs to run, with the joined timing of legacy configurations
+            to_execute = {}
+            
+            for amm_config_data in due_amms:
+                legacy_timing = next(iter(amm_config_data.get("legacy_timing", [])), None)
+                timing_data = amm_config_data.get("timing_definition") or legacy_timing
+                # Lightweight stand-in; a full AMMConfiguration is only built for AMMs that run
+                amm_config = SimpleNamespace(
+                    id=amm_config_data["id"],
+                    last_execution=amm_config_data.get("last_execution"),
+                    next_execution=amm_config_data.get("next_execution")
+                )
                 
-                if not timing_def_data:
+                if not timing_data:
                     logger.warning(f"Timing definition not found for AMM {amm_config.id}")
                     continue
-                    
-                timing_def = TimingDefinition(**timing_def_data)
                 
-                # Check if AMM should execute now
-                should_execute = await self._should_execute_now(amm_config, timing_def, current_time)
+                try:
+                    timing = compile_timing(timing_data)
+                except ValueError as e:
+                    # A malformed start/end time only skips this AMM, not the whole tick
+                    logger.error(f"Invalid timing definition for AMM {amm_config.id}: {e}")
+                    from system_logger import SystemLogger
+                    await SystemLogger.error(
+                        SystemLogger.AMM_SCHEDULER,
+                        f"Invalid timing definition for AMM configuration {amm_config.id}: {str(e)}",
+                        details={"config_id": amm_config.id, "error": str(e)}
+                    )
+                    continue
                 
-                if should_execute:
-                    await self._execute_amm(amm_config)
+                # Check if AMM should execute now
+                if self._should_execute_now(amm_config, timing, current_time):
+                    to_execute[amm_config.id] = None if amm_config_data.get("timing_definition") else legacy_timing
+                else:
+                    next_at = next_execution_time(timing, amm_config.last_execution, current_time)
+                    if next_at != amm_config.next_execution:
+                        next_updates.append(UpdateOne({"id": amm_config.id}, {"$set": {"next_execution": next_at}}))
+            
+            if next_updates:
+                await self.db.amm_configurations.bulk_write(next_updates, ordered=False)
+            
+            if not to_execute:
+                return
+            
+            configs = await self.db.amm_configurations.find(
+                {"id": {"$in": list(to_execute)}}, {"_id": 0}
+            ).to_list(length=None)
+            amm_configs = [AMMConfiguration(**config) for config in configs]
+            for amm_config in amm_configs:
+                legacy_timing = to_execute.get(amm_config.id)
+                if amm_config.timing_definition is None and legacy_timing:
+                    # Keep the joined definition so _execute_amm doesn't fetch it again
+                    amm_config.timing_definition = TimingDefinition(**legacy_timing)
+            
+            await self._load_legacy_measurement_definitions(amm_configs)
+            # Run due AMMs concurrently (bounded inside _execute_amm) so one slow order doesn't hold up the rest
+            await asyncio.gather(*(self._execute_amm(c, current_time) for c in amm_configs), return_exceptions=True)
                     
         except Exception as e:
             logger.error(f"Error checking scheduled AMMs: {e}")
             
-    async def _should_execute_now(self, amm_config: AMMConfiguration, 
-                                timing_def: TimingDefinition, current_time: datetime) -> bool:
-        """Determine if an AMM should execute at the current time"""
+    async def _load_legacy_measurement_definitions(self, amm_configs: List[AMMConfiguration]):
+        """Attach measurement definitions to configurations created before embedding, in one query"""
+        missing = {c.measurement_definition_id for c in amm_configs if c.measurement_definition is None}
+        if not missing:
+            return
         
-        # Check if there's already a running execution
-        running_execution = await self.db.amm_executions.find_one({
-            "amm_config_id": amm_config.id,
-            "status": "running"
-        })
+        definitions = await self.db.measurement_definitions.find(
+            {"id": {"$in": list(missing)}}, {"_id": 0}
+        ).to_list(length=None)
+        by_id = {definition["id"]: definition for definition in definitions}
+        
+        for amm_config in amm_configs:
+            definition = by_id.get(amm_config.measurement_definition_id)
+            if amm_config.measurement_definition is None and definition:
+                amm_config.measurement_definition = MeasurementDefinition(**definition)
+            
+    async def _get_timing_definition(self, amm_config: AMMConfiguration) -> Optional[TimingDefinition]:
+        """Get the embedded timing definition, or load it for configurations created before embedding"""
+        if amm_config.timing_definition is not None:
+            return amm_config.timing_definition
+        
+        timing_def_data = await self.db.timing_definitions.find_one({
+            "id": amm_config.timing_definition_id
+        }, {"_id": 0})
+        return TimingDefinition(**timing_def_data) if timing_def_data else None
+    
+    def _should_execute_now(self, amm_config: AMMConfiguration, 
+                            timing: CompiledTiming, current_time: datetime) -> bool:
+        """Determine if an AMM should execute at the current time (running AMMs are already excluded)"""
         
-        if running_execution:
-            return False  # Don't start if already running
-            
         # Check last execution to avoid duplicate runs
         if amm_config.last_execution:
             time_since_last = current_time - amm_config.last_execution
-            if time_since_last.total_seconds() < 60:  # Less than 1 minute
+            if time_since_last.total_seconds() < MIN_EXECUTION_GAP_SECONDS:
                 return False
                 
-        return self._check_timing_conditions(timing_def, current_time, amm_config)
+        return self._check_timing_conditions(timing, current_time, amm_config)
         
-    def _check_timing_conditions(self, timing_def: TimingDefinition, current_time: datetime, amm_config: AMMConfiguration) -> bool:
+    def _check_timing_conditions(self, timing: CompiledTiming, current_time: datetime, amm_config: AMMConfiguration) -> bool:
         """Check if timing conditions are met for execution"""
         
-        logger.debug(f"Checking timing for AMM {amm_config.id}: schedule_type={timing_def.schedule_type}")
+        logger.debug(f"Checking timing for AMM {amm_config.id}: schedule_type={timing.schedule_type}")
         
-        if timing_def.schedule_type == ScheduleType.ALWAYS:
+        if timing.schedule_type == ScheduleType.ALWAYS:
             logger.debug("Schedule type ALWAYS - executing")
             return True
             
-        elif timing_def.schedule_type == ScheduleType.SPAN:
-            if timing_def.start_date and timing_def.end_date:
-                # Convert to date-only comparison to check if within date range
+        elif timing.schedule_type == ScheduleType.SPAN:
+            if timing.start_day and timing.end_day:
+                # Date-only comparison to check if within date range
                 current_date = current_time.date()
-                start_date = timing_def.start_date.date() if hasattr(timing_def.start_date, 'date') else timing_def.start_date
-                end_date = timing_def.end_date.date() if hasattr(timing_def.end_date, 'date') else timing_def.end_date
-                
-                in_date_range = start_date <= current_date <= end_date
-                logger.debug(f"SPAN check: {start_date} <= {current_date} <= {end_date} = {in_date_range}")
+                in_date_range = timing.start_day <= current_date <= timing.end_day
+                logger.debug(f"SPAN check: {timing.start_day} <= {current_date} <= {timing.end_day} = {in_date_range}")
                 
                 # Also check time range if provided
-                if in_date_range and timing_def.start_time and timing_def.end_time:
-                    current_time_str = current_time.strftime("%H:%M:%S")
-                    in_time_range = timing_def.start_time <= current_time_str <= timing_def.end_time
-                    logger.debug(f"Time check: {timing_def.start_time} <= {current_time_str} <= {timing_def.end_time} = {in_time_range}")
+                if in_date_range and timing.start_time and timing.end_time:
+                    in_time_range = timing.start_seconds <= _seconds_of_day(current_time) <= timing.end_seconds
+                    logger.debug(f"Time check: {timing.start_time} <= {current_time.time()} <= {timing.end_time} = {in_time_range}")
                     return in_time_range
                     
                 return in_date_range
                 
-        elif timing_def.schedule_type == ScheduleType.DAILY:
-            if timing_def.start_time and timing_def.end_time:
-                current_time_only = current_time.time()
-                return timing_def.start_time <= current_time_only <= timing_def.end_time
-                
-        elif timing_def.schedule_type == ScheduleType.WEEKDAYS:
-            if timing_def.weekdays and timing_def.start_time and timing_def.end_time:
-                current_weekday = current_time.weekday()  # 0=Monday
-                current_time_only = current_time.time()
+        elif timing.schedule_type == ScheduleType.DAILY:
+            if timing.start_time and timing.end_time:
+                return timing.start_seconds <= _seconds_of_day(current_time) <= timing.end_seconds
                 
-                return (current_weekday in timing_def.weekdays and 
-                       timing_def.start_time <= current_time_only <= timing_def.end_time)
+        elif timing.schedule_type == ScheduleType.WEEKDAYS:
+            if timing.weekday_mask and timing.start_time and timing.end_time:
+                # weekday() is 0=Monday, matching the mask bits
+                return bool(timing.weekday_mask >> current_time.weekday() & 1 and
+                            timing.start_seconds <= _seconds_of_day(current_time) <= timing.end_seconds)
                        
-        elif timing_def.schedule_type == ScheduleType.INTERVAL:
+        elif timing.schedule_type == ScheduleType.INTERVAL:
             if not amm_config.last_execution:
                 return True  # First execution
                 
-            interval_seconds = 0
-            if timing_def.interval_minutes:
-                interval_seconds += timing_def.interval_minutes * 60
-            if timing_def.interval_hours:
-                interval_seconds += timing_def.interval_hours * 3600
-            if timing_def.interval_days:
-                interval_seconds += timing_def.interval_days * 86400
-                
-            if interval_seconds > 0:
+            if timing.interval_seconds > 0:
                 time_since_last = current_time - amm_config.last_execution
-                return time_since_last.total_seconds() >= interval_seconds
+                return time_since_last.total_seconds() >= timing.interval_seconds
                 
         return False
         
-    async def _execute_amm(self, amm_config: AMMConfiguration):
-        """Execute an AMM configuration"""
+    async def _execute_amm(self, amm_config: AMMConfiguration, now: Optional[datetime] = None):
+        """Execute an AMM configuration at `now` (the scheduler tick time, or the current time)"""
+        async with self._exec_sem:
+            await self._run_amm(amm_config, now or datetime.utcnow())
+        
+    async def _run_amm(self, amm_config: AMMConfiguration, now: datetime):
+        """Generate the XML order for one AMM execution and record the outcome"""
         try:
             from system_logger import SystemLogger
             
@@ -185,27 +486,25 @@ class AMMScheduler:
             # Create execution record
             execution = AMMExecution(
                 amm_config_id=amm_config.id,
-                started_at=datetime.utcnow()
+                started_at=now
             )
             
-            await self.db.amm_executions.insert_one(execution.dict())
+            await self.db.amm_executions.insert_one(execution.model_dump())
             
             # Get measurement definition
-            measurement_def_data = await self.db.measurement_definitions.find_one({
-                "id": amm_config.measurement_definition_id
-            })
-            
-            if not measurement_def_data:
-                raise Exception(f"Measurement definition not found: {amm_config.measurement_definition_id}")
+            measurement_def = amm_config.measurement_definition
+            if measurement_def is None:
+                measurement_def_data = await self.db.measurement_definitions.find_one({
+                    "id": amm_config.measurement_definition_id
+                }, {"_id": 0})
                 
-            measurement_def = MeasurementDefinition(**measurement_def_data)
+                if not measurement_def_data:
+                    raise Exception(f"Measurement definition not found: {amm_config.measurement_definition_id}")
+                    
+                measurement_def = MeasurementDefinition(**measurement_def_data)
             
             # Get timing definition
-            timing_def_data = await self.db.timing_definitions.find_one({
-                "id": amm_config.timing_definition_id
-            })
-            
-            timing_def = TimingDefinition(**timing_def_data) if timing_def_data else None
+            timing_def = await self._get_timing_definition(amm_config)
             
             # Generate XML order for Argus
             order_id = self.xml_processor.generate_order_id("OR")  # Use OR prefix for measurement orders
@@ -215,25 +514,23 @@ class AMMScheduler:
             
             # Create XML order
             xml_content = self.xml_processor.create_measurement_order(order_id, xml_params)
-            xml_file = self.xml_processor.save_request(xml_content, order_id)
+            xml_file = await asyncio.to_thread(self.xml_processor.save_request, xml_content, order_id)
             logger.debug(f"XML order saved to: {xml_file}")
             
-            # Update execution with generated order
-            await self.db.amm_executions.update_one(
-                {"id": execution.id},
-                {
-                    "$push": {"generated_orders": order_id},
-                    "$inc": {"measurements_performed": 1}
-                }
-            )
-            
-            # Update AMM configuration
-            await self.db.amm_configurations.update_one(
-                {"id": amm_config.id},
-                {
-                    "$set": {"last_execution": datetime.utcnow()},
-                    "$inc": {"execution_count": 1}
-                }
+            # Update execution with generated order and the AMM configuration together
+            await asyncio.gather(
+                self.db.amm_executions.update_one(
+                    {"id": execution.id},
+                    {
+                        "$set": {
+                            "status": "completed",
+                            "completed_at": datetime.utcnow()
+                        },
+                        "$push": {"generated_orders": order_id},
+                        "$inc": {"measurements_performed": 1}
+                    }
+                ),
+                self._record_execution(amm_config.id, now, timing=compile_timing(timing_def) if timing_def else None)
             )
             
             logger.info(f"AMM execution started successfully: {order_id}")
@@ -261,36 +558,50 @@ class AMMScheduler:
                 }
             )
             
-            # Update execution with error
-            await self.db.amm_executions.update_one(
-                {"id": execution.id},
-                {
-                    "$set": {
-                        "status": "failed",
-                        "error_message": str(e),
-                        "completed_at": datetime.utcnow()
+            # Update execution with error and the AMM config error count together
+            await asyncio.gather(
+                self.db.amm_executions.update_one(
+                    {"id": execution.id},
+                    {
+                        "$set": {
+                            "status": "failed",
+                            "error_message": str(e),
+                            "completed_at": datetime.utcnow()
+                        }
                     }
-                }
+                ),
+                self._record_execution(amm_config.id, now, error=str(e))
             )
             
-            # Update AMM config error count
-            await self.db.amm_configurations.update_one(
-                {"id": amm_config.id},
-                {
-                    "$inc": {"error_count": 1},
-                    "$set": {"last_error": str(e)}
-                }
-            )
+    async def _record_execution(self, config_id: str, now: datetime, error: Optional[str] = None,
+                                timing: Optional[CompiledTiming] = None):
+        """Atomically bump an AMM configuration's execution counters in one update"""
+        next_at = now + timedelta(seconds=MIN_EXECUTION_GAP_SECONDS)
+        if timing:
+            next_at = next_execution_time(timing, now, now)
+        update = {
+            "$inc": {"execution_count": 1, "error_count": 1 if error else 0},
+            "$set": {
+                "last_execution": now,
+                # Earliest time the scheduler needs to look at this AMM again
+                "next_execution": next_at
+            }
+        }
+        if error:
+            update["$set"]["last_error"] = error
             
+        await self.db.amm_configurations.update_one({"id": config_id}, update)
+        
     def _convert_amm_to_xml_params(self, measurement_def: MeasurementDefinition, timing_def: Optional[TimingDefinition], order_id: str) -> dict:
         """Convert AMM measurement definition to XML order parameters"""
-        params = {
-            "name": f"AMM_{measurement_def.name}",
-            "task": measurement_def.measurement_type.value,
-            "result_type": "CMR",  # Changed to CMR (Compressed Measurement Result)
-            "priority": "LOW",
-            "creator": "Extern"
-        }
+        params = dict(ORDER_PARAM_DEFAULTS)
+        now = datetime.now()
+        params.update(
+            name=f"AMM_{measurement_def.name}",
+            task=measurement_def.measurement_type.value,
+            start_time=now,
+            stop_time=now
+        )
         
         # Add timing parameters if available
         if timing_def:
@@ -302,32 +613,20 @@ class AMMScheduler:
         # Result type configuration (ORM 4.1)
         if measurement_def.result_type:
             params["result_type"] = measurement_def.result_type
-        else:
-            params["result_type"] = "MR"  # Default to Measurement Result
         
         # Station parameters - CRITICAL for ORM 4.2
         if measurement_def.station_names and len(measurement_def.station_names) > 0:
             # Use first station from the list
-            station_pc = measurement_def.station_names[0]
-            params["station_pc"] = station_pc
+            params["station_pc"] = params["station_name"] = measurement_def.station_names[0]
             
         # Signal path (system path) - ORM 4.2: Use MSP_SIG_PATH
         if measurement_def.signal_path:
             # Use the signal_path directly from measurement definition
             params["signal_path"] = measurement_def.signal_path
         elif measurement_def.device_name:
-            # If device_name looks like a signal path (contains +, -, etc), use it directly
-            if any(char in measurement_def.device_name for char in ['+', '-', ' ']):
-                params["signal_path"] = measurement_def.device_name
-            else:
-                # Otherwise, construct a basic signal path
-                params["signal_path"] = f"{measurement_def.device_name}"
-        else:
-            params["signal_path"] = "ADD197+075-EB500 DF"  # Default
-            
-        # Station metadata
-        params["station_name"] = params.get("station_pc", "UMS300-100801")
-        params["station_type"] = "F"  # Fixed station
+            # A device name is used as the signal path whether or not it already
+            # looks like one (contains +, - or spaces)
+            params["signal_path"] = measurement_def.device_name
         
         # Frequency parameters
         params["freq_mode"] = measurement_def.frequency_mode
@@ -348,31 +647,12 @@ class AMMScheduler:
             params["if_bandwidth"] = receiver.if_bandwidth
         if receiver.rf_attenuation:
             params["rf_attenuation"] = receiver.rf_attenuation
-        else:
-            params["rf_attenuation"] = "Auto"
-            
         if receiver.demodulation:
             params["demod"] = receiver.demodulation
-        else:
-            params["demod"] = "Off"
-            
         if receiver.measurement_time:
             params["meas_time"] = receiver.measurement_time
-        else:
-            params["meas_time"] = -1
-            
         if receiver.detector:
             params["detect_type"] = receiver.detector
-        else:
-            params["detect_type"] = "Peak"
-            
-        # Additional MDT parameters with defaults
-        params["if_attenuation"] = "Normal"
-        params["preamplification"] = "Off"
-        params["mode"] = "Normal"
-        params["if_span"] = 250000
-        params["squelch"] = "Off"
-        params["hold_time"] = 0
             
         # Measurement data type
         if measurement_def.measured_parameters:
@@ -382,77 +662,14 @@ class AMMScheduler:
                 params["meas_data_type"] = "FM"
             elif "Bearing" in measurement_def.measured_parameters:
                 params["meas_data_type"] = "BE"
-        else:
-            params["meas_data_type"] = "LV"  # Default to Level
             
         # Antenna configuration
-        antenna = measurement_def.antenna_config
-        if antenna.antenna_path:
-            params["ant_port"] = antenna.antenna_path
-        else:
-            params["ant_port"] = "P1"
-        params["ant_mode"] = "FIX"
-        
-        # Time parameters
-        params["time_mode"] = "P"  # Periodic
-        params["start_time"] = datetime.now()
-        params["stop_time"] = datetime.now()
-        
-        # Location parameters (defaults for Colombia)
-        params["longitude"] = -77.264667
-        params["latitude"] = 1.201194
-        params["height"] = 600
-        
-        # Operator name
-        params["operator_name"] = "ArgusUI"
+        if measurement_def.antenna_config.antenna_path:
+            params["ant_port"] = measurement_def.antenna_config.antenna_path
                 
         return params
         
     async def get_next_execution_time(self, amm_config: AMMConfiguration, 
                                     timing_def: TimingDefinition) -> Optional[datetime]:
         """Calculate the next execution time for an AMM"""
-        current_time = datetime.utcnow()
-        
-        if timing_def.schedule_type == ScheduleType.ALWAYS:
-            return current_time  # Always ready to run
-            
-        elif timing_def.schedule_type == ScheduleType.SPAN:
-            if timing_def.start_date and current_time < timing_def.start_date:
-                return timing_def.start_date
-            elif timing_def.end_date and current_time > timing_def.end_date:
-                return None  # Span has ended
-            else:
-                return current_time  # Within span
-                
-        elif timing_def.schedule_type == ScheduleType.INTERVAL:
-            if not amm_config.last_execution:
-                return current_time  # First execution
-                
-            interval_seconds = 0
-            if timing_def.interval_minutes:
-                interval_seconds += timing_def.interval_minutes * 60
-            if timing_def.interval_hours:
-                interval_seconds += timing_def.interval_hours * 3600
-            if timing_def.interval_days:
-                interval_seconds += timing_def.interval_days * 86400
-                
-            if interval_seconds > 0:
-                return amm_config.last_execution + timedelta(seconds=interval_seconds)
-                
-        # For daily/weekdays, calculate next occurrence
-        elif timing_def.schedule_type in [ScheduleType.DAILY, ScheduleType.WEEKDAYS]:
-            if timing_def.start_time:
-                next_date = current_time.date()
-                if current_time.time() > timing_def.start_time:
-                    next_date += timedelta(days=1)
-                    
-                next_datetime = datetime.combine(next_date, timing_def.start_time)
-                
-                # For weekdays, find next valid day
-                if timing_def.schedule_type == ScheduleType.WEEKDAYS and timing_def.weekdays:
-                    while next_datetime.weekday() not in timing_def.weekdays:
-                        next_datetime += timedelta(days=1)
-                        
-                return next_datetime
-                
-        return None
+        return next_execution_time(compile_timing(timing_def), amm_config.last_execution, datetime.utcnow())
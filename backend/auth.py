@@ -1,34 +1,116 @@
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 import hashlib
-from jose import JWTError, jwt
+import hmac
+from jose import JWTError, jwk, jwt
 from datetime import datetime, timedelta
-from typing import Optional
-from models import User, UserRole
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from batch_writer import BatchWriter
+from models import AuthProvider, User, UserRole
+from pymongo import UpdateOne
+import auth_ad
 import os
 import asyncio
+import logging
+import time
 
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this")
 ALGORITHM = "HS256"
+# HMAC key built once: python-jose otherwise re-encodes and re-validates the
+# secret on every encode/decode
+SIGNING_KEY = jwk.construct(SECRET_KEY, ALGORITHM)
+# Every token we issue carries these; reject any that doesn't
+JWT_DECODE_OPTIONS = {"require_exp": True, "require_sub": True}
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Argon2id cost: memory (KiB), passes and lanes per hash or verify. Raising
+# them makes each login slower for attackers and for us alike
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "19456"))
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+password_hasher = PasswordHasher(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM
+)
+# Validated tokens are reused for up to a minute (never past their expiry)
+TOKEN_CACHE_TTL = 60
+TOKEN_CACHE_MAX_ENTRIES = 10000
 
 # Security
 security = HTTPBearer()
 
+logger = logging.getLogger(__name__)
+
+class LoginUpdateWriter(BatchWriter):
+    """
+    Coalesces per-login user updates (last_login, AD profile fields)
+    
+    Successful logins queue their $set fields here instead of waiting on an
+    update_one each; pending updates are merged per user and written with
+    one unordered bulk_write every few seconds, or sooner once many are queued.
+    on_saved is called with the ids of the users each write updated.
+    """
+    
+    FLUSH_INTERVAL = 5
+    MAX_BATCH = 256
+    
+    def __init__(self, db, on_saved: Callable[[Iterable[str]], None]):
+        super().__init__(self._save_updates, "login updates", self.FLUSH_INTERVAL, max_batch=self.MAX_BATCH)
+        self.db = db
+        self.on_saved = on_saved
+    
+    def add(self, user_id: str, fields: dict):
+        """Queue fields to $set on a user"""
+        super().add((user_id, fields))
+    
+    async def _save_updates(self, batch: List[Tuple[str, dict]]):
+        """Apply a batch of updates, merged per user, with a single unordered bulk_write"""
+        updates: Dict[str, dict] = {}
+        for user_id, fields in batch:
+            updates.setdefault(user_id, {}).update(fields)
+        await self.db.users.bulk_write(
+            [UpdateOne({"id": user_id}, {"$set": fields}) for user_id, fields in updates.items()],
+            ordered=False
+        )
+        self.on_saved(updates.keys())
+
 class AuthManager:
     def __init__(self, db):
         self.db = db
+        # token digest -> (monotonic deadline, user document)
+        self._token_cache: Dict[bytes, Tuple[float, dict]] = {}
+        # (username, password digest) -> login in progress, shared by identical attempts
+        self._inflight_logins: Dict[Tuple[str, bytes], "asyncio.Future[Optional[User]]"] = {}
+        # Cached tokens of a user are dropped once their login update is written
+        self.login_writer = LoginUpdateWriter(db, self.invalidate_user_ids)
     
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """Verify a password against its hash"""
-        # Simple SHA-256 hash for development/demo purposes
-        return self.get_password_hash(plain_password) == hashed_password
+        if hashed_password.startswith("$argon2"):
+            try:
+                return password_hasher.verify(hashed_password, plain_password)
+            except (VerificationError, InvalidHashError):
+                return False
+        # Legacy SHA-256 hashes, upgraded to Argon2id on the next login.
+        # Compare bytes: compare_digest raises on non-ASCII str input
+        legacy_hash = hashlib.sha256(plain_password.encode()).hexdigest()
+        return hmac.compare_digest(legacy_hash.encode(), hashed_password.encode())
     
     def get_password_hash(self, password: str) -> str:
         """Hash a password"""
-        # Simple SHA-256 hash for development/demo purposes
-        return hashlib.sha256(password.encode()).hexdigest()
+        return password_hasher.hash(password)
+    
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """Whether a stored hash is not Argon2id with the current parameters"""
+        if not hashed_password.startswith("$argon2"):
+            return True
+        try:
+            return password_hasher.check_needs_rehash(hashed_password)
+        except InvalidHashError:
+            return True
     
     def create_access_token(self, data: dict, expires_delta: Optional[timedelta] = None):
         """Create JWT access token"""
@@ -38,24 +120,43 @@ class AuthManager:
         else:
             expire = datetime.utcnow() + timedelta(minutes=15)
         to_encode.update({"exp": expire})
-        encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+        encoded_jwt = jwt.encode(to_encode, SIGNING_KEY, algorithm=ALGORITHM)
         return encoded_jwt
     
     async def authenticate_user(self, username: str, password: str) -> Optional[User]:
+        """
+        Authenticate user with username and password
+        Concurrent attempts with the same credentials share a single AD bind
+        and database round trip
+        """
+        key = (username, hashlib.blake2b(password.encode(), digest_size=16).digest())
+        login = self._inflight_logins.get(key)
+        if login is None:
+            login = asyncio.ensure_future(self._authenticate_user(username, password))
+            self._inflight_logins[key] = login
+            login.add_done_callback(lambda _: self._inflight_logins.pop(key, None))
+        return await asyncio.shield(login)
+    
+    async def _authenticate_user(self, username: str, password: str) -> Optional[User]:
         """
         Authenticate user with username and password
         Tries AD authentication first (if enabled), then falls back to local
         """
         # Try Active Directory authentication first
         try:
-            from auth_ad import ad_authenticator
+            # Module attribute: server.py replaces it when it initializes AD
+            ad_authenticator = auth_ad.ad_authenticator
             
-            if ad_authenticator.enabled:
-                ad_result = ad_authenticator.authenticate(username, password)
+            if ad_authenticator is not None and ad_authenticator.enabled:
+                # ldap3 binds are blocking network calls
+                ad_result = await asyncio.to_thread(ad_authenticator.authenticate, username, password)
                 
                 if ad_result['success']:
                     # AD authentication successful
                     user_info = ad_result['user_info']
+                    # DOMAIN\user and UPN logins map to the same local account as
+                    # the bare sAMAccountName
+                    username = ad_result['username']
                     
                     # Check if user exists in local database
                     user_doc = await self.db.users.find_one({"username": username})
@@ -63,17 +164,13 @@ class AuthManager:
                     if user_doc:
                         # Update existing user
                         user = User(**user_doc)
-                        await self.db.users.update_one(
-                            {"id": user.id},
-                            {"$set": {
-                                "last_login": datetime.utcnow(),
-                                "auth_provider": "ad",
-                                "email": user_info.get('email') or user.email
-                            }}
-                        )
+                        self.login_writer.add(user.id, {
+                            "last_login": datetime.utcnow(),
+                            "auth_provider": "ad",
+                            "email": user_info.get('email') or user.email
+                        })
                     else:
                         # Create new user from AD
-                        from models import AuthProvider
                         user = User(
                             username=username,
                             email=user_info.get('email'),
@@ -83,37 +180,19 @@ class AuthManager:
                         )
                         await self.db.users.insert_one(user.dict())
                     
-                    # Log successful AD login
-                    try:
-                        from system_logger import SystemLogger
-                        await SystemLogger.info(
-                            SystemLogger.AUTH,
-                            f"Successful AD login: {username}",
-                            user_id=user.id,
-                            details={"username": username, "auth_provider": "ad"}
-                        )
-                    except:
-                        pass
+                    self._log_auth("INFO", f"Successful AD login: {username}", user.id,
+                                   username=username, auth_provider="ad")
                     
                     return user
         except Exception as e:
             # AD authentication error, fall back to local
-            import logging
-            logging.warning(f"AD authentication failed, falling back to local: {str(e)}")
+            logger.warning(f"AD authentication failed, falling back to local: {str(e)}")
         
         # Fallback to local authentication
-        user_doc = await self.db.users.find_one({"username": username, "is_active": True})
+        user_doc = await self.db.users.find_one({"username": username, "is_active": True}, {"_id": 0})
         if not user_doc:
-            # Log failed login attempt - user not found
-            try:
-                from system_logger import SystemLogger
-                await SystemLogger.warning(
-                    SystemLogger.AUTH,
-                    f"Failed login attempt: User '{username}' not found",
-                    details={"username": username, "reason": "user_not_found"}
-                )
-            except:
-                pass
+            self._log_auth("WARNING", f"Failed login attempt: User '{username}' not found", None,
+                           username=username, reason="user_not_found")
             return None
         
         user = User(**user_doc)
@@ -121,52 +200,43 @@ class AuthManager:
         # Check if user has password_hash (local auth)
         if "password_hash" not in user_doc:
             # User exists but has no local password (AD-only user)
-            try:
-                from system_logger import SystemLogger
-                await SystemLogger.warning(
-                    SystemLogger.AUTH,
-                    f"Failed login attempt: User '{username}' is AD-only, no local password",
-                    user_id=user.id,
-                    details={"username": username, "reason": "ad_only_user"}
-                )
-            except:
-                pass
+            self._log_auth("WARNING", f"Failed login attempt: User '{username}' is AD-only, no local password",
+                           user.id, username=username, reason="ad_only_user")
             return None
         
-        if not self.verify_password(password, user_doc["password_hash"]):
-            # Log failed login attempt - incorrect password
-            try:
-                from system_logger import SystemLogger
-                await SystemLogger.warning(
-                    SystemLogger.AUTH,
-                    f"Failed login attempt: Incorrect password for user '{username}'",
-                    user_id=user.id,
-                    details={"username": username, "reason": "incorrect_password"}
-                )
-            except:
-                pass
+        # Password hashing is CPU-bound, keep it off the event loop
+        password_hash = user_doc["password_hash"]
+        if not await asyncio.to_thread(self.verify_password, password, password_hash):
+            self._log_auth("WARNING", f"Failed login attempt: Incorrect password for user '{username}'",
+                           user.id, username=username, reason="incorrect_password")
             return None
         
-        # Update last login
-        await self.db.users.update_one(
-            {"id": user.id},
-            {"$set": {"last_login": datetime.utcnow()}}
-        )
-        
-        # Log successful login
-        try:
-            from system_logger import SystemLogger
-            await SystemLogger.info(
-                SystemLogger.AUTH,
-                f"User '{username}' logged in successfully",
-                user_id=user.id,
-                details={"username": username, "role": user.role}
+        # Update last login, upgrading the password hash right away if it is outdated
+        login_update = {"last_login": datetime.utcnow()}
+        if self.needs_rehash(password_hash):
+            login_update["password_hash"] = await asyncio.to_thread(self.get_password_hash, password)
+            await self.db.users.update_one(
+                {"id": user.id},
+                {"$set": login_update}
             )
-        except:
-            pass
+            self.invalidate_user(username)
+        else:
+            self.login_writer.add(user.id, login_update)
+        
+        self._log_auth("INFO", f"User '{username}' logged in successfully", user.id,
+                       username=username, role=user.role)
         
         return user
     
+    @staticmethod
+    def _log_auth(level: str, message: str, user_id: Optional[str], **details):
+        """Record an authentication event without waiting for the database write"""
+        try:
+            from system_logger import SystemLogger
+            SystemLogger.log_deferred(level, SystemLogger.AUTH, message, user_id=user_id, details=details)
+        except Exception as e:
+            logger.warning(f"Could not log authentication event: {str(e)}")
+    
     async def get_current_user(self, credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
         """Get current user from JWT token"""
         credentials_exception = HTTPException(
@@ -175,20 +245,57 @@ class AuthManager:
             headers={"WWW-Authenticate": "Bearer"},
         )
         
+        token = credentials.credentials
+        # Keyed by digest so raw bearer tokens are not kept in memory
+        token_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+        cached = self._token_cache.get(token_key)
+        if cached is not None and time.monotonic() < cached[0]:
+            return User(**cached[1])
+        
         try:
-            payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+            payload = jwt.decode(token, SIGNING_KEY, algorithms=[ALGORITHM], options=JWT_DECODE_OPTIONS)
             username: str = payload.get("sub")
             if username is None:
                 raise credentials_exception
         except JWTError:
             raise credentials_exception
         
-        user_doc = await self.db.users.find_one({"username": username, "is_active": True})
+        user_doc = await self.db.users.find_one(
+            {"username": username, "is_active": True}, {"_id": 0, "password_hash": 0}
+        )
         if user_doc is None:
             raise credentials_exception
         
+        ttl = TOKEN_CACHE_TTL
+        if "exp" in payload:
+            ttl = min(ttl, payload["exp"] - time.time())
+        if ttl > 0:
+            self._cache_token(token_key, time.monotonic() + ttl, user_doc)
+        
         return User(**user_doc)
     
+    def _cache_token(self, token_key: bytes, deadline: float, user_doc: dict):
+        """Remember a validated token, evicting expired or oldest entries when full"""
+        if token_key not in self._token_cache and len(self._token_cache) >= TOKEN_CACHE_MAX_ENTRIES:
+            now = time.monotonic()
+            for key in [k for k, (expires, _) in self._token_cache.items() if expires <= now]:
+                del self._token_cache[key]
+            if len(self._token_cache) >= TOKEN_CACHE_MAX_ENTRIES:
+                # Drop the oldest entry
+                self._token_cache.pop(next(iter(self._token_cache)))
+        self._token_cache[token_key] = (deadline, user_doc)
+    
+    def invalidate_user(self, username: str):
+        """Forget cached tokens of a user whose document changed"""
+        for key in [k for k, (_, doc) in self._token_cache.items() if doc.get("username") == username]:
+            del self._token_cache[key]
+    
+    def invalidate_user_ids(self, user_ids: Iterable[str]):
+        """Forget cached tokens of users, by id, whose documents changed"""
+        user_ids = set(user_ids)
+        for key in [k for k, (_, doc) in self._token_cache.items() if doc.get("id") in user_ids]:
+            del self._token_cache[key]
+    
     async def require_admin(self, current_user: User = Depends(get_current_user)) -> User:
         """Require admin role"""
         if current_user.role != UserRole.ADMIN:
@@ -199,22 +306,44 @@ class AuthManager:
         return current_user
     
     async def create_default_admin(self):
-        """Create default admin user if none exists"""
-        # Delete existing admin users first (for development)
-        await self.db.users.delete_many({"username": "admin"})
-        
-        admin_user = {
-            "id": "admin-001",
-            "username": "admin",
-            "password_hash": self.get_password_hash("admin123"),
-            "role": UserRole.ADMIN,
-            "auth_provider": "local",
-            "is_active": True,
-            "created_at": datetime.utcnow()
-        }
-        await self.db.users.insert_one(admin_user)
+        """Create the default admin user, resetting its password if it exists (for development)"""
+        await self.db.users.update_one(
+            {"username": "admin"},
+            {
+                "$set": {
+                    "id": "admin-001",
+                    "password_hash": self.get_password_hash("admin123"),
+                    "role": UserRole.ADMIN,
+                    "auth_provider": "local",
+                    "is_active": True
+                },
+                "$setOnInsert": {"created_at": datetime.utcnow()}
+            },
+            upsert=True
+        )
         print("Default admin user created (username: admin, password: admin123)")
 
+async def ensure_indexes(db):
+    """
+    Create the indexes backing login and token validation
+    
+    Every authenticated request looks a user up by username and is_active;
+    without an index that is a scan of the users collection. Usernames and
+    ids are also unique; those indexes can't be built while duplicates exist,
+    so each index is attempted on its own.
+    """
+    indexes = (
+        ([("username", 1), ("is_active", 1)], {}),
+        ([("username", 1)], {"unique": True}),
+        ([("id", 1)], {"unique": True}),
+    )
+    for keys, options in indexes:
+        try:
+            await db.users.create_index(keys, **options)
+        except Exception as e:
+            logger.warning(f"Could not create user index {keys}: {str(e)}")
+    logger.info("User indexes ensured")
+
 # Global auth manager instance (will be initialized in main app)
 auth_manager: Optional[AuthManager] = None
 
@@ -4,18 +4,41 @@ Provides AD authentication with fallback to local authentication
 """
 import logging
 import os
-from typing import Optional, Dict, Any
-from ldap3 import Server, Connection, ALL, NTLM, SIMPLE
+import socket
+import threading
+import time
+from typing import Optional, Dict, Any, Tuple
+from ldap3 import Server, Connection, ALL, NONE, NTLM, SIMPLE, RESTARTABLE
 from ldap3.core.exceptions import LDAPException, LDAPBindError
+from ldap3.utils.conv import escape_filter_chars
 
 logger = logging.getLogger(__name__)
 
+# AD configuration fields stored encrypted in the database
+AD_SENSITIVE_FIELDS = ('server', 'domain', 'base_dn', 'bind_user', 'bind_password')
+
+# Reconnect attempts of the shared service connection before a lookup gives up on it
+SERVICE_CONNECTION_RETRIES = 2
+
+# Seconds to skip the service account after its bind fails, so a wrong bind
+# password does not add a failed bind (and towards AD lockout) on every login
+SERVICE_BIND_BACKOFF_SECONDS = 300
+
+# Seconds to wait for the AD server to accept a connection or answer a request
+LDAP_TIMEOUT_SECONDS = 5
+
 class ADAuthenticator:
     """Active Directory authentication handler"""
     
     def __init__(self, db=None):
         # Try to load from encrypted database first, fallback to .env
         self.db = db
+        # Server and service-account connection reused across logins
+        self._server: Optional[Server] = None
+        self._service_conn: Optional[Connection] = None
+        # Monotonic time of the last failed service-account bind
+        self._service_failed_at: Optional[float] = None
+        self._service_lock = threading.Lock()
         self.load_config()
     
     def load_config(self):
@@ -51,8 +74,7 @@ class ADAuthenticator:
                     from crypto_utils import get_encryption
                     encryption = get_encryption()
                     
-                    sensitive_fields = ['server', 'domain', 'base_dn', 'bind_user', 'bind_password']
-                    decrypted = encryption.decrypt_dict(config_doc, sensitive_fields)
+                    decrypted = encryption.decrypt_dict(config_doc, AD_SENSITIVE_FIELDS)
                     
                     self.enabled = decrypted.get('enabled', False)
                     self.server_url = decrypted.get('server', self.server_url)
@@ -86,6 +108,118 @@ class ADAuthenticator:
         """Reload configuration from database"""
         self.db = db
         self.load_config()
+        self._reset_connections()
+    
+    def _reset_connections(self):
+        """Drop the cached server and service connection so the next login uses the current config"""
+        with self._service_lock:
+            if self._service_conn is not None:
+                try:
+                    self._service_conn.unbind()
+                except Exception:
+                    pass
+            self._service_conn = None
+            self._service_failed_at = None
+            self._server = None
+    
+    def _get_server(self) -> Server:
+        """Server used for logins; skips the schema/DSE fetch, which logins never need"""
+        if self._server is None:
+            self._server = Server(
+                self.server_url,
+                port=self.port,
+                get_info=NONE,
+                use_ssl=self.use_ssl,
+                connect_timeout=LDAP_TIMEOUT_SECONDS
+            )
+        return self._server
+    
+    def _get_service_connection(self) -> Optional[Connection]:
+        """
+        Long-lived connection bound as the service account, used for user lookups
+        
+        RESTARTABLE reopens and rebinds the socket if the server drops it.
+        Returns None when no bind account is configured, or while backing off
+        after a failed bind. Call with _service_lock held.
+        """
+        if not (self.bind_user and self.bind_password):
+            return None
+        if (self._service_failed_at is not None
+                and time.monotonic() - self._service_failed_at < SERVICE_BIND_BACKOFF_SECONDS):
+            return None
+        if self._service_conn is None or self._service_conn.closed:
+            connection = Connection(
+                self._get_server(),
+                user=f"{self.domain}\\{self.bind_user}",
+                password=self.bind_password,
+                authentication=NTLM,
+                client_strategy=RESTARTABLE,
+                receive_timeout=LDAP_TIMEOUT_SECONDS
+            )
+            # ldap3 retries 30 times a second apart by default; fail fast and let
+            # the login fall back to the user's connection instead
+            connection.strategy.restartable_tries = SERVICE_CONNECTION_RETRIES
+            connection.strategy.restartable_sleep_time = 0
+            try:
+                if not connection.bind():
+                    raise LDAPBindError(f"Service account bind failed: {connection.result}")
+            except Exception:
+                self._service_failed_at = time.monotonic()
+                try:
+                    connection.unbind()
+                except Exception:
+                    pass
+                raise
+            self._service_failed_at = None
+            # Keep the idle connection (and its TLS session) from being dropped
+            # by firewalls between lookups
+            if connection.socket is not None:
+                connection.socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            self._service_conn = connection
+        return self._service_conn
+    
+    def _lookup_user_info(self, user_connection: Connection, account_name: str,
+                          search_filter: str) -> Dict[str, Any]:
+        """Look the user up over the service connection, or the user's own when there is none"""
+        with self._service_lock:
+            try:
+                service_conn = self._get_service_connection()
+            except LDAPException as e:
+                logger.warning(f"AD service connection unavailable, using user connection: {str(e)}")
+                self._service_conn = None
+                service_conn = None
+            if service_conn is not None:
+                return self._get_user_info(service_conn, account_name, search_filter)
+        return self._get_user_info(user_connection, account_name, search_filter)
+    
+    def _is_own_domain(self, domain: str) -> bool:
+        """Whether a login's domain is the configured one, by DNS or NetBIOS-style name"""
+        domain = domain.upper()
+        configured = self.domain.upper()
+        return domain == configured or domain == configured.split('.', 1)[0]
+    
+    def _bind_identity(self, username: str) -> Optional[Tuple[str, str, str, str]]:
+        """
+        Bind DN, authentication method, sAMAccountName and search filter for a login name
+        
+        DOMAIN\\user binds as given with NTLM and user@domain as a UPN with a
+        simple bind. A bare name, the usual case, binds as DOMAIN\\name with
+        NTLM so the password is never sent in clear on plain LDAP.
+        Returns None for names in another domain: the user lookup only
+        searches this domain's base DN.
+        """
+        if '\\' in username:
+            domain, account_name = username.split('\\', 1)
+            if not self._is_own_domain(domain):
+                return None
+            return username, NTLM, account_name, f"(sAMAccountName={escape_filter_chars(account_name)})"
+        if '@' in username:
+            account_name, domain = username.split('@', 1)
+            if not self._is_own_domain(domain):
+                return None
+            # The UPN prefix need not be the sAMAccountName; the lookup resolves it
+            return username, SIMPLE, account_name, f"(userPrincipalName={escape_filter_chars(username)})"
+        return f"{self.domain}\\{username}", NTLM, username, f"(sAMAccountName={escape_filter_chars(username)})"
     
     def authenticate(self, username: str, password: str) -> Dict[str, Any]:
         """
@@ -99,6 +233,7 @@ class ADAuthenticator:
             Dictionary with authentication result:
             {
                 'success': bool,
+                'username': str,  # if success, the sAMAccountName
                 'user_info': dict,  # if success
                 'error': str  # if failed
             }
@@ -116,59 +251,52 @@ class ADAuthenticator:
             }
         
         try:
-            # Create LDAP server object
-            server = Server(
-                self.server_url,
-                port=self.port,
-                get_info=ALL,
-                use_ssl=self.use_ssl
-            )
-            
-            # Try different authentication formats
-            user_formats = [
-                f"{self.domain}\\{username}",  # DOMAIN\username
-                f"{username}@{self.domain}",    # username@DOMAIN
-                f"CN={username},{self.base_dn}"  # CN=username,DC=...
-            ]
+            server = self._get_server()
             
-            connection = None
-            last_error = None
+            identity = self._bind_identity(username)
+            if identity is None:
+                logger.warning(f"AD authentication rejected for user outside {self.domain}: {username}")
+                return {
+                    'success': False,
+                    'error': f'User is not in the {self.domain} domain'
+                }
+            user_dn, authentication, account_name, search_filter = identity
             
-            for user_dn in user_formats:
-                try:
-                    logger.debug(f"Attempting AD bind with: {user_dn}")
+            try:
+                logger.debug(f"Attempting AD bind with: {user_dn}")
+                
+                connection = Connection(
+                    server,
+                    user=user_dn,
+                    password=password,
+                    authentication=authentication,
+                    read_only=True,
+                    receive_timeout=LDAP_TIMEOUT_SECONDS,
+                    auto_bind=True
+                )
+                
+                if connection.bound:
+                    logger.info(f"AD authentication successful for user: {username}")
+                    
+                    # Retrieve user information
+                    user_info = self._lookup_user_info(connection, account_name, search_filter)
                     
-                    connection = Connection(
-                        server,
-                        user=user_dn,
-                        password=password,
-                        authentication=NTLM if '\\' in user_dn else SIMPLE,
-                        auto_bind=True
-                    )
+                    connection.unbind()
                     
-                    if connection.bound:
-                        logger.info(f"AD authentication successful for user: {username}")
-                        
-                        # Retrieve user information
-                        user_info = self._get_user_info(connection, username)
-                        
-                        connection.unbind()
-                        
-                        return {
-                            'success': True,
-                            'user_info': user_info
-                        }
-                        
-                except LDAPBindError as e:
-                    last_error = str(e)
-                    logger.debug(f"Bind failed for {user_dn}: {last_error}")
-                    continue
-                except Exception as e:
-                    last_error = str(e)
-                    logger.debug(f"Connection failed for {user_dn}: {last_error}")
-                    continue
+                    return {
+                        'success': True,
+                        'username': user_info['username'],
+                        'user_info': user_info
+                    }
+                last_error = str(connection.result)
+                
+            except LDAPBindError as e:
+                last_error = str(e)
+                logger.debug(f"Bind failed for {user_dn}: {last_error}")
+            except Exception as e:
+                last_error = str(e)
+                logger.debug(f"Connection failed for {user_dn}: {last_error}")
             
-            # All formats failed
             logger.warning(f"AD authentication failed for user: {username}")
             return {
                 'success': False,
@@ -190,28 +318,30 @@ class ADAuthenticator:
                 'error': error_msg
             }
     
-    def _get_user_info(self, connection: Connection, username: str) -> Dict[str, Any]:
+    def _get_user_info(self, connection: Connection, username: str, search_filter: str) -> Dict[str, Any]:
         """
         Retrieve user information from Active Directory
         
         Args:
             connection: Active LDAP connection
-            username: Username to query
+            username: sAMAccountName to report if the user is not found
+            search_filter: LDAP filter matching the user
             
         Returns:
             Dictionary with user information
         """
         try:
             # Search for user
-            search_filter = f"(sAMAccountName={username})"
             connection.search(
                 search_base=self.base_dn,
                 search_filter=search_filter,
-                attributes=['cn', 'mail', 'displayName', 'memberOf', 'department']
+                attributes=['sAMAccountName', 'cn', 'mail', 'displayName', 'memberOf', 'department']
             )
             
             if connection.entries:
                 entry = connection.entries[0]
+                if hasattr(entry, 'sAMAccountName'):
+                    username = str(entry.sAMAccountName)
                 
                 # Extract group memberships
                 groups = []
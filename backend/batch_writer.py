@@ -0,0 +1,130 @@
+"""
+Batched background writes for ArgusUI
+Queues items from hot paths and hands them to a flush callback in batches
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class BatchWriter:
+    """
+    Collects items and writes them in batches from a background task
+    
+    add() queues an item and returns at once. The flush loop starts on the
+    first add, waits flush_interval for more items to arrive (less once
+    max_batch are queued) and passes the queued items to the flush callback,
+    at most max_batch per call. With max_pending the queue is bounded and
+    the oldest items are dropped when it is full.
+    
+    A batch whose write fails is queued again and retried after RETRY_DELAY,
+    up to max_retries times; after that it is dropped with an error log.
+    """
+    
+    # Seconds to wait before retrying a batch whose write failed
+    RETRY_DELAY = 1.0
+    
+    def __init__(
+        self,
+        flush: Callable[[List[Any]], Awaitable[None]],
+        description: str,
+        flush_interval: float,
+        max_batch: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        max_retries: int = 0
+    ):
+        """
+        Args:
+            flush: Coroutine function writing one batch of items
+            description: What the items are, for log messages
+            flush_interval: Seconds to let items accumulate before a write
+            max_batch: Most items passed to one flush call (no limit if None)
+            max_pending: Most items kept queued (no limit if None)
+            max_retries: Times a failed batch is retried before it is dropped
+        """
+        self._flush = flush
+        self.description = description
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        # Consecutive failed writes of the batch at the head of the queue
+        self._failures = 0
+        self._stopping = False
+        self._pending: deque = deque(maxlen=max_pending)
+        self._pending_event = asyncio.Event()
+        self._full_event = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+    
+    def add(self, item: Any):
+        """Queue an item for the next batched write. Must be called from the event loop"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        self._pending.append(item)
+        self._pending_event.set()
+        if self.max_batch is not None and len(self._pending) >= self.max_batch:
+            self._full_event.set()
+    
+    async def _flush_loop(self):
+        """Write pending items in batches"""
+        while not self._stopping:
+            try:
+                await self._pending_event.wait()
+                if self._stopping:
+                    break
+                # Let items queued together accumulate before writing
+                try:
+                    await asyncio.wait_for(self._full_event.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                if not await self._flush_pending():
+                    await asyncio.sleep(self.RETRY_DELAY)
+            
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error saving {self.description}: {str(e)}")
+    
+    async def _flush_pending(self) -> bool:
+        """
+        Pass all pending items to the flush callback, max_batch per call
+        
+        Returns False when a batch failed and was queued again for a retry.
+        """
+        self._pending_event.clear()
+        self._full_event.clear()
+        while self._pending:
+            size = len(self._pending) if self.max_batch is None else min(self.max_batch, len(self._pending))
+            batch = [self._pending.popleft() for _ in range(size)]
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                self._failures += 1
+                if self._failures > self.max_retries:
+                    self._failures = 0
+                    self._dropped(batch, e)
+                    continue
+                logger.warning(f"Error saving {self.description}, retrying: {str(e)}")
+                self._pending.extendleft(reversed(batch))
+                self._pending_event.set()
+                return False
+            self._failures = 0
+        return True
+    
+    def _dropped(self, batch: List[Any], error: Exception):
+        """Report a batch given up on after its retries"""
+        logger.error(f"Error saving {self.description}, dropped {len(batch)}: {str(error)}")
+    
+    async def stop(self):
+        """Stop the writer, saving anything still queued"""
+        # Let a write in progress finish instead of cancelling it halfway
+        self._stopping = True
+        self._pending_event.set()
+        self._full_event.set()
+        if self._flush_task:
+            await self._flush_task
+            self._flush_task = None
+        while not await self._flush_pending():
+            await asyncio.sleep(self.RETRY_DELAY)
+        self._stopping = False
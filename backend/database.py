@@ -0,0 +1,46 @@
+"""
+Shared MongoDB connection for ArgusUI
+Every module uses the same Motor client so requests share one connection pool
+
+Pool settings come from the environment. Each uvicorn worker opens its own
+pool, so keep MONGO_MAX_POOL_SIZE x workers below mongod's connection limit.
+
+Motor runs every PyMongo call on a shared thread pool of MOTOR_MAX_WORKERS
+threads (default 5 x CPU count), read by Motor at import. At most that many
+queries are in flight per process, whatever the connection pool size.
+"""
+import os
+import logging
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+logger = logging.getLogger(__name__)
+
+_client_instance = None
+
+def get_client() -> AsyncIOMotorClient:
+    """Get or create the global Motor client"""
+    global _client_instance
+    if _client_instance is None:
+        mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017/")
+        max_pool_size = int(os.environ.get("MONGO_MAX_POOL_SIZE", "100"))
+        min_pool_size = int(os.environ.get("MONGO_MIN_POOL_SIZE", "10"))
+        # PyMongo only opens 2 connections at a time by default, which throttles
+        # bursts of concurrent (asyncio.gather) queries while the pool warms up
+        max_connecting = int(os.environ.get("MONGO_MAX_CONNECTING", "8"))
+        # Close connections idle for 5 minutes; fail fast when mongod is unreachable
+        max_idle_time_ms = int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", "300000"))
+        server_selection_timeout_ms = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "3000"))
+        _client_instance = AsyncIOMotorClient(
+            mongo_url,
+            maxPoolSize=max_pool_size,
+            minPoolSize=min_pool_size,
+            maxConnecting=max_connecting,
+            maxIdleTimeMS=max_idle_time_ms,
+            serverSelectionTimeoutMS=server_selection_timeout_ms
+        )
+        logger.info(f"MongoDB client created (pool size {min_pool_size}-{max_pool_size})")
+    return _client_instance
+
+def get_database() -> AsyncIOMotorDatabase:
+    """Get the application database from the shared client"""
+    return get_client()[os.environ.get("DB_NAME", "argus_ui")]
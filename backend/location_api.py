@@ -6,6 +6,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+import asyncio
 import logging
 import uuid
 import os
@@ -142,7 +143,7 @@ def create_location_router(db, xml_processor: ArgusXMLProcessor) -> APIRouter:
                 )
                 
                 # Save to inbox
-                xml_file = xml_processor.save_request(xml_content, order_id)
+                xml_file = await asyncio.to_thread(xml_processor.save_request, xml_content, order_id)
                 order_ids.append(order_id)
                 
                 # Store order in MongoDB
@@ -230,7 +231,7 @@ def create_location_router(db, xml_processor: ArgusXMLProcessor) -> APIRouter:
                 )
                 
                 # Save to inbox
-                xml_file = xml_processor.save_request(xml_content, order_id)
+                xml_file = await asyncio.to_thread(xml_processor.save_request, xml_content, order_id)
                 order_ids.append(order_id)
                 
                 # Store order in MongoDB
@@ -2,7 +2,6 @@ from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request
 from fastapi.security import HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 from contextlib import asynccontextmanager
 import os
 import asyncio
@@ -11,6 +10,12 @@ from pathlib import Path
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 
+# Configuration
+# Loaded before the local imports: importing them builds the shared MongoDB
+# client, which reads MONGO_URL, DB_NAME and the pool settings
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
 # Import our models and utilities
 from models import (
     User, UserCreate, UserRole, 
@@ -22,17 +27,13 @@ from xml_processor import ArgusXMLProcessor
 from auth import AuthManager, get_current_user, require_admin
 import auth as auth_module
 from data_navigator_api import create_data_navigator_router
-from amm_api import create_amm_router
+from amm_api import create_amm_router, ensure_indexes as ensure_amm_indexes
 from amm_scheduler import AMMScheduler
+from database import get_client, get_database
 
-# Configuration
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
-
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection (single pooled client shared by every module)
+client = get_client()
+db = get_database()
 
 # Argus XML processor (will be configured via environment or API)
 xml_processor: Optional[ArgusXMLProcessor] = None
@@ -74,7 +75,7 @@ async def startup_gss_request():
             
             order_id = xml_processor.generate_order_id("GSS")
             xml_content = xml_processor.create_system_state_request(order_id, sender=control_station, sender_pc=sender_pc)
-            xml_file = xml_processor.save_request(xml_content, order_id)
+            xml_file = await asyncio.to_thread(xml_processor.save_request, xml_content, order_id)
             
             # Create order record
             order = ArgusOrder(
@@ -102,6 +103,7 @@ async def lifespan(app: FastAPI):
     
     # Initialize auth manager
     auth_module.auth_manager = AuthManager(db)
+    await auth_module.ensure_indexes(db)
     await auth_module.auth_manager.create_default_admin()
     
     # Initialize XML processor with default paths (can be overridden via API)
@@ -121,6 +123,7 @@ async def lifespan(app: FastAPI):
     global amm_router
     amm_router = create_amm_router(db, amm_scheduler)
     app.include_router(amm_router)
+    await ensure_amm_indexes(db)
     logger.info("AMM Router initialized and included")
     
     # Initialize and include SMDI router
@@ -150,6 +153,7 @@ async def lifespan(app: FastAPI):
     adc_generator = ADCOrderGenerator(adc_inbox_path, adc_data_path)
     adc_router = adc_api.create_adc_router(db, adc_generator)
     app.include_router(adc_router)
+    await adc_api.ensure_indexes(db)
     logger.info(f"ADC Module initialized - INBOX: {adc_inbox_path}")
     
     # Initialize Active Directory with database for encrypted config
@@ -159,7 +163,8 @@ async def lifespan(app: FastAPI):
     
     # Initialize Active Directory API
     import ad_api
-    app.include_router(ad_api.router, tags=["Active Directory"])
+    ad_api.set_dependencies(db)
+    app.include_router(ad_api.router)
     logger.info("Active Directory API initialized")
     
     # Initialize Location Measurements (DF/TDOA) API
@@ -212,6 +217,15 @@ async def lifespan(app: FastAPI):
         await amm_scheduler.stop_scheduler()
         logger.info("AMM Scheduler stopped")
     
+    # Save ADC order metadata still waiting for its batched write
+    await adc_api.order_writer.stop()
+    
+    # Save login updates and authentication log entries still waiting for their batched write
+    if auth_module.auth_manager:
+        await auth_module.auth_manager.login_writer.stop()
+    from system_logger import deferred_writer
+    await deferred_writer.stop()
+    
     # Stop file watcher
     file_watcher.stop()
     client.close()
@@ -486,7 +500,7 @@ async def get_system_status(current_user: User = Depends(get_current_user)):
                 
                 order_id = xml_processor.generate_order_id("GSS")
                 xml_content = xml_processor.create_system_state_request(order_id, sender=control_station, sender_pc=sender_pc)
-                xml_file = xml_processor.save_request(xml_content, order_id)
+                xml_file = await asyncio.to_thread(xml_processor.save_request, xml_content, order_id)
                 
                 order = ArgusOrder(
                     order_id=order_id,
@@ -542,7 +556,7 @@ async def request_system_parameters_alt(current_user: User = Depends(get_current
         
         order_id = xml_processor.generate_order_id("GSP")
         xml_content = xml_processor.create_system_params_request(order_id, sender=control_station, sender_pc=sender_pc)
-        xml_file = xml_processor.save_request(xml_content, order_id)
+        xml_file = await asyncio.to_thread(xml_processor.save_request, xml_content, order_id)
         
         order = ArgusOrder(
             order_id=order_id,
@@ -625,7 +639,7 @@ async def request_system_state(current_user: User = Depends(get_current_user)):
         xml_content = xml_processor.create_system_state_request(order_id, sender=control_station, sender_pc=sender_pc)
         
         # Save request
-        xml_file = xml_processor.save_request(xml_content, order_id)
+        xml_file = await asyncio.to_thread(xml_processor.save_request, xml_content, order_id)
         
         # Create order record
         order = ArgusOrder(
@@ -668,7 +682,7 @@ async def request_system_parameters(current_user: User = Depends(get_current_use
         xml_content = xml_processor.create_system_params_request(order_id, sender=control_station, sender_pc=sender_pc)
         
         # Save request
-        xml_file = xml_processor.save_request(xml_content, order_id)
+        xml_file = await asyncio.to_thread(xml_processor.save_request, xml_content, order_id)
         
         # Create order record
         order = ArgusOrder(
@@ -898,7 +912,7 @@ async def start_direct_measurement(request: DirectMeasurementRequest,
         # Generate order
         order_id = xml_processor.generate_order_id("MEAS")
         xml_content = xml_processor.create_measurement_order(order_id, meas_params)
-        xml_file = xml_processor.save_request(xml_content, order_id)
+        xml_file = await asyncio.to_thread(xml_processor.save_request, xml_content, order_id)
         
         # Create order record
         order = ArgusOrder(
@@ -1430,23 +1444,27 @@ def parse_xml_measurement_data(file_path: str) -> Dict[str, Any]:
     tree = ET.parse(file_path)
     root = tree.getroot()
     
-    # Extract measurement info
-    meas_type = root.findtext(".//MEAS_TYPE", "UNKNOWN")
-    frequency = root.findtext(".//FREQUENCY")
-    
-    # Parse data points
+    # Extract measurement info and data points in a single pass over the tree
+    meas_type = None
+    frequency = None
     data = []
-    for point in root.findall(".//DATA_POINT"):
-        data_point = {}
-        for child in point:
-            try:
-                data_point[child.tag.lower()] = float(child.text)
-            except (ValueError, TypeError):
-                data_point[child.tag.lower()] = child.text
-        data.append(data_point)
+    for elem in root.iter():
+        tag = elem.tag
+        if tag == "DATA_POINT":
+            data_point = {}
+            for child in elem:
+                try:
+                    data_point[child.tag.lower()] = float(child.text)
+                except (ValueError, TypeError):
+                    data_point[child.tag.lower()] = child.text
+            data.append(data_point)
+        elif tag == "MEAS_TYPE" and meas_type is None:
+            meas_type = elem.text or ""
+        elif tag == "FREQUENCY" and frequency is None:
+            frequency = elem.text or ""
     
     return {
-        "measurement_type": meas_type,
+        "measurement_type": meas_type if meas_type is not None else "UNKNOWN",
         "frequency": float(frequency) if frequency else None,
         "data": data
     }
@@ -1584,4 +1602,7 @@ app.add_middleware(
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    # WebSocket keepalive uses protocol ping frames (see /api/adc/ws/stream).
+    # uvicorn runs on uvloop and httptools whenever they are installed
+    # (requirements.txt; uvloop is not available on Windows).
+    uvicorn.run(app, host="0.0.0.0", port=8001, ws_ping_interval=20, ws_ping_timeout=20)
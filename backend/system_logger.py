@@ -4,9 +4,9 @@ Provides centralized logging functionality for all system events
 """
 import logging
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from typing import Optional, Dict, Any, List
+from batch_writer import BatchWriter
+from database import get_database
 from models import SystemLog
 import uuid
 
@@ -17,11 +17,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# MongoDB connection
-MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017/")
-DB_NAME = os.environ.get("DB_NAME", "argus_ui")
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
+# MongoDB connection (shared client)
+db = get_database()
 
 class SystemLogger:
     """Centralized system logger for ArgusUI"""
@@ -67,47 +64,76 @@ class SystemLogger:
             details: Optional additional details as dictionary
         """
         try:
-            # Create log entry
-            log_entry = SystemLog(
-                id=str(uuid.uuid4()),
-                timestamp=datetime.now(timezone.utc),
-                level=level,
-                source=source,
-                message=message,
-                user_id=user_id,
-                order_id=order_id,
-                details=details
+            await db.system_logs.insert_one(
+                SystemLogger._prepare(level, source, message, user_id, order_id, details)
             )
             
-            # Log to console
-            log_msg = f"[{source}] {message}"
-            if user_id:
-                log_msg += f" | User: {user_id}"
-            if order_id:
-                log_msg += f" | Order: {order_id}"
-            
-            if level == SystemLogger.ERROR or level == SystemLogger.CRITICAL:
-                logger.error(log_msg)
-            elif level == SystemLogger.WARNING:
-                logger.warning(log_msg)
-            elif level == SystemLogger.DEBUG:
-                logger.debug(log_msg)
-            else:
-                logger.info(log_msg)
-            
-            # Save to MongoDB
-            log_dict = log_entry.dict()
-            # Convert datetime to ISO string for MongoDB storage
-            if isinstance(log_dict.get('timestamp'), datetime):
-                log_dict['timestamp'] = log_dict['timestamp'].isoformat()
-            
-            await db.system_logs.insert_one(log_dict)
-            
         except Exception as e:
             # Fallback to console logging if DB insert fails
             logger.error(f"Failed to log system event: {str(e)}")
             logger.error(f"Original log: [{source}] {message}")
     
+    @staticmethod
+    def log_deferred(
+        level: str,
+        source: str,
+        message: str,
+        user_id: Optional[str] = None,
+        order_id: Optional[str] = None,
+        details: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Log a system event to the console now and to MongoDB in the next batch
+        
+        For hot paths that should not wait on a database round trip.
+        Must be called from the event loop.
+        """
+        try:
+            deferred_writer.add(
+                SystemLogger._prepare(level, source, message, user_id, order_id, details)
+            )
+        except Exception as e:
+            logger.error(f"Failed to log system event: {str(e)}")
+            logger.error(f"Original log: [{source}] {message}")
+    
+    @staticmethod
+    def _prepare(level: str, source: str, message: str, user_id: Optional[str],
+                 order_id: Optional[str], details: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Log an event to the console and build its MongoDB document"""
+        # Create log entry
+        log_entry = SystemLog(
+            id=str(uuid.uuid4()),
+            timestamp=datetime.now(timezone.utc),
+            level=level,
+            source=source,
+            message=message,
+            user_id=user_id,
+            order_id=order_id,
+            details=details
+        )
+        
+        # Log to console
+        log_msg = f"[{source}] {message}"
+        if user_id:
+            log_msg += f" | User: {user_id}"
+        if order_id:
+            log_msg += f" | Order: {order_id}"
+        
+        if level == SystemLogger.ERROR or level == SystemLogger.CRITICAL:
+            logger.error(log_msg)
+        elif level == SystemLogger.WARNING:
+            logger.warning(log_msg)
+        elif level == SystemLogger.DEBUG:
+            logger.debug(log_msg)
+        else:
+            logger.info(log_msg)
+        
+        log_dict = log_entry.dict()
+        # Convert datetime to ISO string for MongoDB storage
+        if isinstance(log_dict.get('timestamp'), datetime):
+            log_dict['timestamp'] = log_dict['timestamp'].isoformat()
+        return log_dict
+    
     @staticmethod
     async def info(source: str, message: str, user_id: Optional[str] = None, 
                    order_id: Optional[str] = None, details: Optional[Dict[str, Any]] = None):
@@ -145,3 +171,35 @@ async def log_system_event(level: str, source: str, message: str,
                           details: Optional[Dict[str, Any]] = None):
     """Helper function to log system events (backward compatibility)"""
     await SystemLogger.log(level, source, message, user_id, order_id, details)
+
+
+class DeferredLogWriter(BatchWriter):
+    """
+    Writes deferred system log entries to MongoDB in batches
+    
+    Entries from SystemLogger.log_deferred are queued here and inserted with
+    insert_many. The queue is bounded; when it is full the oldest entries are
+    dropped (they were already logged to the console).
+    """
+    
+    # Window used to coalesce log entries into one insert_many
+    FLUSH_INTERVAL = 0.1
+    MAX_BATCH = 64
+    MAX_PENDING = 1000
+    
+    def __init__(self):
+        super().__init__(
+            self._save_logs,
+            "deferred system logs",
+            self.FLUSH_INTERVAL,
+            max_batch=self.MAX_BATCH,
+            max_pending=self.MAX_PENDING
+        )
+    
+    @staticmethod
+    async def _save_logs(batch: List[Dict[str, Any]]):
+        """Insert a batch of log documents with a single unordered insert_many"""
+        await db.system_logs.insert_many(batch, ordered=False)
+
+
+deferred_writer = DeferredLogWriter()
@@ -7,14 +7,10 @@ from typing import List, Optional
 from datetime import datetime, timedelta
 from models import SystemLog, User
 from auth import get_current_user
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import get_database
 
-# MongoDB connection
-MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017/")
-DB_NAME = os.environ.get("DB_NAME", "argus_ui")
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
+# MongoDB connection (shared client)
+db = get_database()
 
 router = APIRouter(prefix="/logs", tags=["System Logs"])
 
@@ -10,6 +10,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Namespace declared on every XMLSchema1 order root
+XSI_NAMESPACE = "http://www.w3.org/2001/XMLSchema-instance"
+
 class ArgusXMLProcessor:
     def __init__(self, inbox_path: str, outbox_path: str, data_path: str):
         self.inbox_path = Path(inbox_path)
@@ -25,6 +28,9 @@ class ArgusXMLProcessor:
         (self.data_path / "xml_requests").mkdir(exist_ok=True)
         (self.data_path / "xml_responses").mkdir(exist_ok=True)
         (self.data_path / "measurement_results").mkdir(exist_ok=True)
+        
+        # Millisecond timestamp of the last generated order ID
+        self._last_order_ms = 0
 
     def generate_order_id(self, prefix: str = "GSS") -> str:
         """
@@ -32,6 +38,12 @@ class ArgusXMLProcessor:
         Example: OR210914162855677 (OR + 210914 + 162855677)
         """
         now = datetime.now()
+        # Never reuse a millisecond, so orders generated concurrently get distinct IDs
+        order_ms = int(now.timestamp() * 1000)
+        if order_ms <= self._last_order_ms:
+            order_ms = self._last_order_ms + 1
+            now = datetime.fromtimestamp(order_ms // 1000).replace(microsecond=order_ms % 1000 * 1000)
+        self._last_order_ms = order_ms
         date_part = now.strftime("%y%m%d")  # YYMMDD format (note: YY not DD first!)
         time_part = now.strftime("%H%M%S")  # HHMMSS format
         counter = now.strftime("%f")[:3]    # Milliseconds as 3-digit counter
@@ -41,7 +53,7 @@ class ArgusXMLProcessor:
         """Create GSS (Get System State) XML request"""
         # Create root with proper namespace
         root = ET.Element("XMLSchema1")
-        root.set("xmlns:xsi", "http://www.w3.org/2001/XMLSchema-instance")
+        root.set("xmlns:xsi", XSI_NAMESPACE)
         
         # Order definition
         order_def = ET.SubElement(root, "ORDER_DEF")
@@ -61,7 +73,7 @@ class ArgusXMLProcessor:
         """Create GSP (Get System Parameters) XML request"""
         # Create root with proper namespace
         root = ET.Element("XMLSchema1")
-        root.set("xmlns:xsi", "http://www.w3.org/2001/XMLSchema-instance")
+        root.set("xmlns:xsi", XSI_NAMESPACE)
         
         # Order definition
         order_def = ET.SubElement(root, "ORDER_DEF")
@@ -85,7 +97,7 @@ class ArgusXMLProcessor:
         """
         # Create root with proper namespace
         root = ET.Element("XMLSchema1")
-        root.set("xmlns:xsi", "http://www.w3.org/2001/XMLSchema-instance")
+        root.set("xmlns:xsi", XSI_NAMESPACE)
         
         # Order definition - UPPERCASE tags as per Argus standard
         order_def = ET.SubElement(root, "ORDER_DEF")
@@ -924,7 +936,7 @@ class ArgusXMLProcessor:
         """
         # Create root with proper namespace
         root = ET.Element("XMLSchema1")
-        root.set("xmlns:xsi", "http://www.w3.org/2001/XMLSchema-instance")
+        root.set("xmlns:xsi", XSI_NAMESPACE)
         
         # Order definition
         order_def = ET.SubElement(root, "ORDER_DEF")
@@ -1045,7 +1057,7 @@ class ArgusXMLProcessor:
         """
         # Create root with proper namespace
         root = ET.Element("XMLSchema1")
-        root.set("xmlns:xsi", "http://www.w3.org/2001/XMLSchema-instance")
+        root.set("xmlns:xsi", XSI_NAMESPACE)
         
         # Order definition
         order_def = ET.SubElement(root, "ORDER_DEF")
@@ -81,6 +81,8 @@ export default function LiveUDPMonitor() {
             console.log('WebSocket handshake complete');
           } else if (message.event === 'capture.received') {
             handleCaptureReceived(message.data);
+          } else if (message.event === 'capture.batch') {
+            message.data.forEach(handleCaptureReceived);
           }
         } catch (error) {
           console.error('Error parsing WebSocket message:', error);
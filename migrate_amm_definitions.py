@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+One-off migration: embed AMM definitions into their configuration documents
+
+AMM configurations used to reference their timing, measurement, range and
+general definitions stored in separate collections. New configurations embed
+them; this copies the definitions of older configurations into the
+configuration document. Run with --delete-legacy to also remove the copied
+documents from the old collections.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Add backend to path
+BACKEND_DIR = Path(__file__).parent / 'backend'
+sys.path.append(str(BACKEND_DIR))
+load_dotenv(BACKEND_DIR / '.env')
+
+from database import get_database
+from amm_api import DEFINITION_COLLECTIONS
+
+async def migrate(delete_legacy: bool = False):
+    """Embed legacy definitions into every AMM configuration missing them"""
+    db = get_database()
+    migrated = 0
+
+    async for config in db.amm_configurations.find({}, {"_id": 0}):
+        update = {}
+        legacy = []
+        for collection, id_field, embedded in DEFINITION_COLLECTIONS:
+            if config.get(embedded) or not config.get(id_field):
+                continue
+            definition = await db[collection].find_one({"id": config[id_field]}, {"_id": 0})
+            if definition:
+                update[embedded] = definition
+                legacy.append((collection, definition["id"]))
+            else:
+                print(f"⚠️  {config['id']}: {collection} {config[id_field]} not found")
+
+        if not update:
+            continue
+
+        await db.amm_configurations.update_one({"id": config["id"]}, {"$set": update})
+        migrated += 1
+        print(f"✅ {config['id']} ({config.get('name')}): embedded {', '.join(update)}")
+
+        if delete_legacy:
+            for collection, definition_id in legacy:
+                await db[collection].delete_one({"id": definition_id})
+
+    print(f"\nMigrated {migrated} AMM configuration(s)")
+
+if __name__ == "__main__":
+    asyncio.run(migrate(delete_legacy="--delete-legacy" in sys.argv))
@@ -69,7 +69,7 @@ if exist "venv\Scripts\activate.bat" (
     echo Virtual environment activated.
     
     REM Start backend in new window
-    start "ArgusUI-Backend-v0.2" cmd /k "title ArgusUI Backend v0.2 && echo ======================================== && echo   ArgusUI Backend v0.2 - API Server && echo   Listening on: http://localhost:8001 && echo   API Docs: http://localhost:8001/docs && echo   Health Check: http://localhost:8001/api/health && echo ======================================== && echo. && echo Starting FastAPI server... && echo. && uvicorn server:app --host 0.0.0.0 --port 8001 --reload"
+    start "ArgusUI-Backend-v0.2" cmd /k "title ArgusUI Backend v0.2 && echo ======================================== && echo   ArgusUI Backend v0.2 - API Server && echo   Listening on: http://localhost:8001 && echo   API Docs: http://localhost:8001/docs && echo   Health Check: http://localhost:8001/api/health && echo ======================================== && echo. && echo Starting FastAPI server... && echo. && uvicorn server:app --host 0.0.0.0 --port 8001 --ws-ping-interval 20 --ws-ping-timeout 20 --reload"
     
     echo ✓ Backend starting in separate window...
 ) else (
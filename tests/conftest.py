@@ -0,0 +1,9 @@
+"""
+Shared pytest setup for the ArgusUI backend tests
+"""
+import sys
+from pathlib import Path
+
+# Backend modules import each other as top-level modules
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
@@ -0,0 +1,308 @@
+"""
+Tests for AMM timing checks and next_execution_time in amm_scheduler
+"""
+import asyncio
+import random
+from datetime import datetime, time, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import system_logger
+from amm_models import ScheduleType, TimingDefinition
+from amm_scheduler import (
+    MIN_EXECUTION_GAP_SECONDS, AMMScheduler, compile_timing, next_execution_time
+)
+
+# A Monday
+MONDAY = datetime(2025, 3, 3)
+
+
+@pytest.fixture(scope="module")
+def scheduler():
+    """Scheduler without a database; the timing checks never touch it"""
+    return AMMScheduler(db=None, xml_processor=None)
+
+
+def _timing(schedule_type: ScheduleType, **fields) -> TimingDefinition:
+    return TimingDefinition(name="test", schedule_type=schedule_type, **fields)
+
+
+def _config(last_execution=None):
+    # The timing checks only read these attributes of an AMMConfiguration
+    return SimpleNamespace(id="amm-test", last_execution=last_execution)
+
+
+def _is_due(scheduler, timing_def, now, last_execution=None) -> bool:
+    return scheduler._should_execute_now(_config(last_execution), compile_timing(timing_def), now)
+
+
+def _reference_check(timing_def: TimingDefinition, current_time: datetime, last_execution) -> bool:
+    """
+    The timing checks as written before timings were compiled
+
+    Stored HH:MM:SS strings are parsed to time objects for every schedule
+    type, as the DAILY and WEEKDAYS checks compared them.
+    """
+    start_time = time.fromisoformat(timing_def.start_time) if timing_def.start_time else None
+    end_time = time.fromisoformat(timing_def.end_time) if timing_def.end_time else None
+
+    if timing_def.schedule_type == ScheduleType.ALWAYS:
+        return True
+
+    elif timing_def.schedule_type == ScheduleType.SPAN:
+        if timing_def.start_date and timing_def.end_date:
+            in_date_range = timing_def.start_date.date() <= current_time.date() <= timing_def.end_date.date()
+            if in_date_range and start_time and end_time:
+                return start_time <= current_time.time() <= end_time
+            return in_date_range
+
+    elif timing_def.schedule_type == ScheduleType.DAILY:
+        if start_time and end_time:
+            return start_time <= current_time.time() <= end_time
+
+    elif timing_def.schedule_type == ScheduleType.WEEKDAYS:
+        if timing_def.weekdays and start_time and end_time:
+            return (current_time.weekday() in timing_def.weekdays and
+                    start_time <= current_time.time() <= end_time)
+
+    elif timing_def.schedule_type == ScheduleType.INTERVAL:
+        if not last_execution:
+            return True
+        interval_seconds = 0
+        if timing_def.interval_minutes:
+            interval_seconds += timing_def.interval_minutes * 60
+        if timing_def.interval_hours:
+            interval_seconds += timing_def.interval_hours * 3600
+        if timing_def.interval_days:
+            interval_seconds += timing_def.interval_days * 86400
+        if interval_seconds > 0:
+            return (current_time - last_execution).total_seconds() >= interval_seconds
+
+    return False
+
+
+def _random_time(rng: random.Random) -> str:
+    if rng.random() < 0.5:
+        # Same boundaries _random_moment favours
+        return f"{rng.randrange(24):02d}:{rng.choice((0, 30)):02d}:00"
+    return f"{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}"
+
+
+def _random_moment(rng: random.Random) -> datetime:
+    moment = MONDAY + timedelta(days=rng.randrange(-10, 30), seconds=rng.randrange(86400))
+    # Land on window boundaries often, with and without microseconds
+    if rng.random() < 0.5:
+        moment = moment.replace(minute=rng.choice((0, 30)), second=0)
+    if rng.random() < 0.3:
+        moment = moment.replace(microsecond=rng.randrange(1000000))
+    return moment
+
+
+def _random_timing(rng: random.Random) -> TimingDefinition:
+    schedule_type = rng.choice(list(ScheduleType))
+    fields = {}
+    if rng.random() < 0.8:
+        fields["start_time"] = _random_time(rng)
+        fields["end_time"] = _random_time(rng)
+        if rng.random() < 0.7:
+            # Mostly well-formed windows
+            fields["start_time"], fields["end_time"] = sorted((fields["start_time"], fields["end_time"]))
+    if rng.random() < 0.8:
+        start_date = MONDAY + timedelta(days=rng.randrange(-5, 20))
+        fields["start_date"] = start_date
+        fields["end_date"] = start_date + timedelta(days=rng.randrange(-1, 10))
+    fields["weekdays"] = rng.sample(range(7), rng.randrange(8))
+    for unit in ("interval_minutes", "interval_hours", "interval_days"):
+        if rng.random() < 0.4:
+            fields[unit] = rng.randrange(0, 5)
+    return _timing(schedule_type, **fields)
+
+
+def _random_last_execution(rng: random.Random, now: datetime):
+    if rng.random() < 0.2:
+        return None
+    return now - timedelta(seconds=rng.choice((0, 30, 59, 60, 61, 3600, rng.randrange(4 * 86400))))
+
+
+# Stored times the window checks must treat as missing or reject
+EMPTY_AND_MALFORMED_TIMES = ("", None, "25:00:00", "12:60", "8am", "12-30-00", "noon")
+
+
+def test_timing_checks_match_reference(scheduler):
+    rng = random.Random(20250303)
+    for _ in range(4000):
+        timing_def = _random_timing(rng)
+        if rng.random() < 0.1:
+            field = rng.choice(("start_time", "end_time"))
+            timing_def = timing_def.model_copy(update={field: rng.choice(EMPTY_AND_MALFORMED_TIMES)})
+        now = _random_moment(rng)
+        last_execution = _random_last_execution(rng, now)
+        try:
+            expected = _reference_check(timing_def, now, last_execution)
+        except ValueError:
+            with pytest.raises(ValueError):
+                compile_timing(timing_def)
+            continue
+        actual = scheduler._check_timing_conditions(compile_timing(timing_def), now, _config(last_execution))
+        assert actual == expected, (timing_def, now, last_execution)
+
+
+def test_next_execution_time_is_never_late(scheduler):
+    rng = random.Random(20250304)
+    for _ in range(3000):
+        timing_def = _random_timing(rng)
+        now = _random_moment(rng)
+        last_execution = _random_last_execution(rng, now)
+        due = next_execution_time(compile_timing(timing_def), last_execution, now)
+        if due is None:
+            continue
+        assert due >= now
+        # Nothing before the bound may pass the checks
+        span = (due - now).total_seconds()
+        samples = [now + timedelta(seconds=rng.uniform(0, span)) for _ in range(20)]
+        samples.append(due - timedelta(microseconds=1))
+        for moment in samples:
+            if now <= moment < due:
+                assert not _is_due(scheduler, timing_def, moment, last_execution), (timing_def, now, moment)
+        # The bound itself passes unless the daily window is empty
+        if not (timing_def.start_time and timing_def.end_time and timing_def.start_time > timing_def.end_time):
+            assert _is_due(scheduler, timing_def, due, last_execution), (timing_def, now, due)
+
+
+def test_compiled_timing_from_model_and_document_match():
+    timing_def = _timing(ScheduleType.WEEKDAYS, start_time="08:00:00", end_time="17:30:00", weekdays=[0, 2, 4])
+    compiled = compile_timing(timing_def)
+    assert compile_timing(timing_def.model_dump()) == compiled
+    assert compiled.start_seconds == 8 * 3600
+    assert compiled.end_seconds == 17 * 3600 + 30 * 60
+    assert compiled.weekday_mask == 0b10101
+
+
+def test_always(scheduler):
+    timing_def = _timing(ScheduleType.ALWAYS)
+    assert _is_due(scheduler, timing_def, MONDAY)
+    assert next_execution_time(compile_timing(timing_def), None, MONDAY) == MONDAY
+
+
+def test_min_execution_gap(scheduler):
+    timing_def = _timing(ScheduleType.ALWAYS)
+    last_execution = MONDAY - timedelta(seconds=MIN_EXECUTION_GAP_SECONDS - 1)
+    assert not _is_due(scheduler, timing_def, MONDAY, last_execution)
+    assert next_execution_time(compile_timing(timing_def), last_execution, MONDAY) == (
+        last_execution + timedelta(seconds=MIN_EXECUTION_GAP_SECONDS)
+    )
+
+
+def test_span(scheduler):
+    timing_def = _timing(
+        ScheduleType.SPAN,
+        start_date=MONDAY + timedelta(days=2), end_date=MONDAY + timedelta(days=4),
+        start_time="09:00:00", end_time="12:00:00"
+    )
+    assert not _is_due(scheduler, timing_def, MONDAY.replace(hour=10))
+    assert _is_due(scheduler, timing_def, MONDAY.replace(hour=10) + timedelta(days=2))
+    assert not _is_due(scheduler, timing_def, MONDAY.replace(hour=13) + timedelta(days=2))
+    assert not _is_due(scheduler, timing_def, MONDAY.replace(hour=10) + timedelta(days=5))
+    compiled = compile_timing(timing_def)
+    assert next_execution_time(compiled, None, MONDAY) == MONDAY.replace(hour=9) + timedelta(days=2)
+    assert next_execution_time(compiled, None, MONDAY + timedelta(days=5)) is None
+
+
+def test_span_without_times_covers_whole_days(scheduler):
+    timing_def = _timing(ScheduleType.SPAN, start_date=MONDAY, end_date=MONDAY)
+    assert _is_due(scheduler, timing_def, MONDAY.replace(hour=23, minute=59))
+    assert not _is_due(scheduler, timing_def, MONDAY + timedelta(days=1))
+
+
+def test_periodic_never_runs(scheduler):
+    timing_def = _timing(ScheduleType.PERIODIC, start_time="00:00:00", end_time="23:59:59")
+    assert not _is_due(scheduler, timing_def, MONDAY.replace(hour=12))
+    assert next_execution_time(compile_timing(timing_def), None, MONDAY) is None
+
+
+def test_daily(scheduler):
+    timing_def = _timing(ScheduleType.DAILY, start_time="08:00:00", end_time="17:00:00")
+    assert not _is_due(scheduler, timing_def, MONDAY.replace(hour=7, minute=59, second=59))
+    assert _is_due(scheduler, timing_def, MONDAY.replace(hour=8))
+    assert _is_due(scheduler, timing_def, MONDAY.replace(hour=17))
+    assert not _is_due(scheduler, timing_def, MONDAY.replace(hour=17, microsecond=1))
+    compiled = compile_timing(timing_def)
+    assert next_execution_time(compiled, None, MONDAY.replace(hour=6)) == MONDAY.replace(hour=8)
+    assert next_execution_time(compiled, None, MONDAY.replace(hour=18)) == (
+        MONDAY.replace(hour=8) + timedelta(days=1)
+    )
+
+
+def test_weekdays(scheduler):
+    timing_def = _timing(ScheduleType.WEEKDAYS, start_time="08:00:00", end_time="17:00:00",
+                         weekdays=[0, 1, 2, 3, 4])
+    assert _is_due(scheduler, timing_def, MONDAY.replace(hour=9))
+    saturday = MONDAY.replace(hour=9) + timedelta(days=5)
+    assert not _is_due(scheduler, timing_def, saturday)
+    next_monday = MONDAY.replace(hour=8) + timedelta(days=7)
+    assert next_execution_time(compile_timing(timing_def), None, saturday) == next_monday
+
+
+def test_weekdays_without_days_never_runs(scheduler):
+    timing_def = _timing(ScheduleType.WEEKDAYS, start_time="08:00:00", end_time="17:00:00")
+    assert not _is_due(scheduler, timing_def, MONDAY.replace(hour=9))
+    assert next_execution_time(compile_timing(timing_def), None, MONDAY) is None
+
+
+def test_interval(scheduler):
+    timing_def = _timing(ScheduleType.INTERVAL, interval_minutes=30, interval_hours=1)
+    compiled = compile_timing(timing_def)
+    assert compiled.interval_seconds == 90 * 60
+    # First execution runs right away
+    assert _is_due(scheduler, timing_def, MONDAY)
+    assert next_execution_time(compiled, None, MONDAY) == MONDAY
+    last_execution = MONDAY - timedelta(minutes=60)
+    assert not _is_due(scheduler, timing_def, MONDAY, last_execution)
+    assert _is_due(scheduler, timing_def, MONDAY + timedelta(minutes=30), last_execution)
+    assert next_execution_time(compiled, last_execution, MONDAY) == MONDAY + timedelta(minutes=30)
+
+
+class _FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self, length=None):
+        return self.documents
+
+
+class _FakeConfigurations:
+    """The amm_configurations calls a tick makes when no AMM runs"""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.written = []
+
+    def aggregate(self, pipeline):
+        return _FakeCursor(self.documents)
+
+    async def bulk_write(self, requests, ordered=True):
+        self.written.extend(requests)
+
+
+def test_malformed_timing_skips_only_that_amm(monkeypatch):
+    logged = []
+
+    async def error(source, message, **kwargs):
+        logged.append(message)
+
+    monkeypatch.setattr(system_logger.SystemLogger, "error", staticmethod(error))
+    broken = _timing(ScheduleType.DAILY, start_time="25:99", end_time="17:00:00").model_dump()
+    valid = _timing(ScheduleType.DAILY, start_time="08:00:00", end_time="17:00:00").model_dump()
+    configurations = _FakeConfigurations([
+        {"id": "amm-broken", "timing_definition": broken},
+        {"id": "amm-valid", "timing_definition": valid}
+    ])
+    scheduler = AMMScheduler(db=SimpleNamespace(amm_configurations=configurations), xml_processor=None)
+
+    asyncio.run(scheduler._check_scheduled_amms(MONDAY.replace(hour=6)))
+
+    assert len(logged) == 1 and "amm-broken" in logged[0]
+    # The valid AMM is still checked and gets its next bound
+    assert [request._filter for request in configurations.written] == [{"id": "amm-valid"}]
+    assert configurations.written[0]._doc == {"$set": {"next_execution": MONDAY.replace(hour=8)}}
@@ -0,0 +1,59 @@
+"""
+Tests for password verification in auth.AuthManager
+"""
+import hashlib
+
+import pytest
+
+from auth import AuthManager
+
+
+@pytest.fixture
+def auth_manager():
+    """AuthManager without a database; password checks never touch it"""
+    return AuthManager(db=None)
+
+
+def _legacy_hash(password: str) -> str:
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def test_argon2_hash_verifies(auth_manager):
+    hashed = auth_manager.get_password_hash("s3cret")
+    assert hashed.startswith("$argon2id$")
+    assert auth_manager.verify_password("s3cret", hashed)
+
+
+def test_argon2_hash_rejects_wrong_password(auth_manager):
+    hashed = auth_manager.get_password_hash("s3cret")
+    assert not auth_manager.verify_password("S3cret", hashed)
+
+
+def test_legacy_sha256_hash_verifies(auth_manager):
+    assert auth_manager.verify_password("admin123", _legacy_hash("admin123"))
+    assert not auth_manager.verify_password("admin124", _legacy_hash("admin123"))
+
+
+def test_legacy_sha256_hash_needs_rehash(auth_manager):
+    assert auth_manager.needs_rehash(_legacy_hash("admin123"))
+    assert not auth_manager.needs_rehash(auth_manager.get_password_hash("admin123"))
+
+
+def test_non_ascii_password_verifies(auth_manager):
+    assert auth_manager.verify_password("contraseña", _legacy_hash("contraseña"))
+    assert auth_manager.verify_password("contraseña", auth_manager.get_password_hash("contraseña"))
+
+
+def test_non_ascii_stored_hash_does_not_raise(auth_manager):
+    assert not auth_manager.verify_password("admin123", "ñ" * 64)
+
+
+@pytest.mark.parametrize("stored_hash", [
+    "",
+    "not-a-hash",
+    "$argon2id$v=19$m=19456,t=2,p=1$garbage",
+    "$2b$12$garbage",
+])
+def test_malformed_hash_does_not_verify(auth_manager, stored_hash):
+    assert not auth_manager.verify_password("admin123", stored_hash)
+    assert auth_manager.needs_rehash(stored_hash)